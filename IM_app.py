@@ -4,10 +4,32 @@ import numpy as np
 import pandas as pd
 import panel as pn
 from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 # Required Impedance Match Calculation classes and functions for this app
 import IM_module as IM 
 
+@lru_cache(maxsize=None)
+def UpGrid(uparr_length):
+    """ Normalized particle velocity array with uparr_length+1 evenly spaced points from 0 to 1.
+        Usage: uparr = UpGrid(uparr_length)*upmax
+        Made once per length and shared, so the returned array is read only.
+    """
+    upnorm = np.linspace(0.,1.,uparr_length+1)
+    upnorm.flags.writeable = False
+    return upnorm
+
+@lru_cache(maxsize=8)
+def UpArray(uparr_length,upmax):
+    """ Particle velocity array with uparr_length+1 evenly spaced points from 0 to upmax (m/s).
+        Usage: uparr = UpArray(uparr_length,upmax)
+        Shared by every material made with the same inputs, so the returned array is read only.
+    """
+    uparr = UpGrid(uparr_length)*upmax
+    uparr.flags.writeable = False
+    return uparr
+
 def IM_app(webappbool=False):
     """ Shock Impedance Matching Tool and code. 
         Usage: IM_app(matdata,imat,webappbool=False)
@@ -32,22 +54,23 @@ def IM_app(webappbool=False):
     # widget splash image and default save file name
     default_image_filename = 'Impact-solution.pdf'
     #
-    plt.rcParams["figure.figsize"] = (9,6)
-    plt.rcParams["figure.dpi"] = 100
-    plt.rc('font', size=10)
+    figsize = (9,6) # inches; figures are made at 100 dpi; the global rcParams are not changed (Material.PlotCurves sets its font in an rc_context)
+    fontsize = 10 # pt; set explicitly on the persistent axes and on each redraw, so the plots do not follow the global rcParams
+    titlesize = 12 # pt
     menuwidth = 300 # pixel width for the left menu column
     #========================================================
     # read in materials database
     # needed by the add material function
-    global matdata,imat
+    # matdata, imat, mat_index (and matihed below) belong to this app instance, so each server session has its own;
+    # the callbacks share them through the closure (nonlocal where they are replaced)
     matdata, imat = IM.ReadMaterials(matfilename='materials-data.csv') # materials-data.csv is the default file name; can replace with your own file name
+    mat_index = IM.MaterialNameIndex(matdata) # material name -> row number in matdata; rebuilt when matdata changes
 
     # w* variables are widgets
 
-    ab_materials = list(matdata.loc[:,'Material'].values)
-    ab_materials.insert(0, 'Choose material')   # empty material at the top of the list
-    bc_materials = list(matdata.loc[:,'Material'].values)
-    bc_materials.insert(0, 'Choose material / No material')   # empty material at the top of the list
+    material_names = list(matdata['Material'].to_numpy()) # read the name column once for all the menus
+    ab_materials = ['Choose material'] + material_names   # empty material at the top of the list
+    bc_materials = ['Choose material / No material'] + material_names   # empty material at the top of the list
 
     wmat1=pn.widgets.Select(
         name='Material 1',
@@ -68,7 +91,7 @@ def IM_app(webappbool=False):
         name='Material 4',
         options=bc_materials,
     )
-    all_materials = list(matdata.loc[:,'Material'].values)
+    all_materials = material_names
     wmat_drop=pn.widgets.Select(
         name='Select material to remove',
         options=all_materials,
@@ -109,22 +132,62 @@ def IM_app(webappbool=False):
 
     if webappbool:
         # no save image button in the web app
-        wcolumn1 = pn.Column('## Shock Impedance Match Tool\nSelect 2 or more materials and impact velocity.<br>Changing impact velocity updates the plot.', wmat1, wmat2, wmat3, wmat4, wvel, wshowdata, wuselocaldata, wusemgmodel, wpmax, wupmax, width=menuwidth)
+        wcolumn1 = pn.Column('## Shock Impedance Match Tool\nSelect 2 or more materials and impact velocity.<br>Changing a material or the impact velocity updates the plot.', wmat1, wmat2, wmat3, wmat4, wvel, wshowdata, wuselocaldata, wusemgmodel, wpmax, wupmax, width=menuwidth)
     else:
         # otherwise there is a save image button
-        wcolumn1 = pn.Column('## Shock Impedance Match Tool\nSelect 2 or more materials and impact velocity<br>Changing impact velocity updates the plot.', wmat1, wmat2, wmat3, wmat4, wvel, wshowdata, wuselocaldata, wusemgmodel, wpmax, wupmax,wsaveimage, width=menuwidth)
-
-    @pn.depends(vel=wvel,usemgmodel=wusemgmodel,showdata=wshowdata,pmax=wpmax,upmax=wupmax)
-    def match_and_plot(vel,usemgmodel,showdata,pmax,upmax,webappbool=webappbool): 
-        # usemgmodel and showdata and pmax are function parameters to trigger redraw of plot
+        wcolumn1 = pn.Column('## Shock Impedance Match Tool\nSelect 2 or more materials and impact velocity<br>Changing a material or the impact velocity updates the plot.', wmat1, wmat2, wmat3, wmat4, wvel, wshowdata, wuselocaldata, wusemgmodel, wpmax, wupmax,wsaveimage, width=menuwidth)
+
+    # cache of materials with Hugoniots already made, keyed by (layer number, name, M-G model flag, rounded impact velocity),
+    # so that redraws that do not change these inputs (plot limits, show data) skip the material set up
+    # cleared whenever the materials database changes
+    matcache = {}
+    def cache_material(matkey,mat,maxsize=16):
+        if len(matcache) >= maxsize:
+            del matcache[next(iter(matcache))] # remove the oldest entry
+        matcache[matkey] = mat
+
+    # one figure for the impedance match plot, redrawn in place on every update
+    with plt.rc_context({'font.size':fontsize}):
+        fig, ax = plt.subplots(figsize=figsize,dpi=100,layout='constrained') # layout is solved during each draw, no separate tight_layout pass
+    plt.close(fig)
+    wfigure = pn.pane.Matplotlib(fig, sizing_mode='scale_width') # pane that displays the figure
+    def on_button_clicked(b):
+        fig.savefig(wfilename.value,bbox_inches='tight',dpi=300)
+    wbutton.on_click(on_button_clicked) # if the save button is clicked, save the figure to a file; registered once
+
+    # autoscale limits of the plot currently shown; empty when there is no plot
+    autolimits = {}
+    def set_plot_limits():
+        if wpmax.value > 0: # don't use negative values
+            ax.set_ylim(0,wpmax.value)
+        else:
+            ax.set_ylim(0,autolimits['pmax'])
+        if wupmax.value > 0:
+            ax.set_xlim(0,wupmax.value)
+        else:
+            ax.set_xlim(0,autolimits['upmax'])
+    def plot_ihed_bool(mat):
+        # IHED points are drawn only when requested and when there are points to draw, so no empty artists are made on a redraw
+        return wshowdata.value and (mat.ihed.id > -1) and (len(mat.ihed.upplot) > 0)
+    def on_limits_changed(event):
+        # plot limits only change the axes of the current plot; the materials and IM states are unchanged
+        if len(autolimits) > 0:
+            set_plot_limits()
+            wfigure.param.trigger('object')
+    wpmax.param.watch(on_limits_changed,'value_throttled')
+    wupmax.param.watch(on_limits_changed,'value_throttled')
+
+    @pn.depends(vel=wvel.param.value_throttled,mat1name=wmat1,mat2name=wmat2,mat3name=wmat3,mat4name=wmat4,usemgmodel=wusemgmodel,showdata=wshowdata)
+    def match_and_plot(vel,mat1name,mat2name,mat3name,mat4name,usemgmodel,showdata,webappbool=webappbool): 
+        # material names, usemgmodel and showdata are function parameters to trigger redraw of plot
+        # the plot limits are applied by on_limits_changed without redoing the IM match
+        # the number inputs are throttled, so holding a spinner arrow redraws once when it is released
+        # each widget change is one call; incomplete setups (no velocity or < 2 materials) return before any plotting
         # the code below accesses the widget values directly
         vel = vel*1.e3 # put impact velocity in m/s
+        autolimits.clear() # set again below if this call makes a plot
         userinfostr='' # variable to hold notes for the user
-        fig = plt.figure() # initialize the figure object
-        plt.close(fig)
         if vel <= 0:
-            fig = plt.figure() # initialize the figure object
-            plt.close(fig)
             winfo.value = '\nNO PLOT. Impact velocity <= 0'
         else:
             # valid impact velocity
@@ -133,13 +196,7 @@ def IM_app(webappbool=False):
             string2=''
             string3=''
             string4=''
-            string_IM_res=''
-            # initialize index for material layer
-            id1=[]
-            id2=[]
-            id3=[]
-            id4=[]
-
+            IM_res_lines=[] # html lines of IM results, joined once for winfo
             #---------------------------------------------------------------------------
             # old way: initialize common up array for all the curves used in IM solution
             # new way: each material can have it's own up array. intersections are solved for numerically with
@@ -152,248 +209,167 @@ def IM_app(webappbool=False):
             else:
                 uparr_length = 2000
             #uparr_length = 2000 # number of points (resolution) of the up array
-            upgeneral = np.arange(0,uparr_length+1)/uparr_length*vel*uparr_factor # m/s
+            # 500 points moves reshock/release states by up to ~0.4% (e.g., 16.79 -> 16.73 GPa),
+            # because the isentropes and reshock Hugoniots are integrated on this grid; keep 2000 for local use
+            # without the MG model, the up array span uses the impact velocity rounded to 3 significant figures,
+            # so small changes in impact velocity reuse the cached materials; only the sampling of the analytic Hugoniot changes.
+            # The MG isentropes and reshock Hugoniots are integrated on this grid, so with the MG model use the exact velocity.
+            if wusemgmodel.value:
+                velgrid = vel # m/s
+            else:
+                velgrid = float('%.3g' % vel) # m/s
+
+            # check the material selections before making any Hugoniots
+            if (wmat1.value not in mat_index) or (wmat2.value not in mat_index):
+                winfo.value = '\nNO PLOT. Need materials 1 and 2.'
+                return
+            if (wmat4.value in mat_index) and (wmat3.value not in mat_index):
+                # missing material 3 so stop
+                winfo.value = 'No plot. Missing material 3'
+                return
 
             # INITIALIZE MATERIALS FROM DROPDOWN MENUS
             # find index and initialize Hugoniot for each material layer (2 to 3 materials needed)
-            id1 = np.where(matdata.loc[:,'Material'].values == wmat1.value)[0]
-            if len(id1)>0: # material 1 has been set
-                mat1 = IM.Material()
-                mat1.DefineParamsID(wmat1.value,matdata,imat)
-                if wusemgmodel.value and (mat1.rho0 < 5000):
+            mats = [None,None,None,None] # Material object for each layer; None if no material selected
+            matkeys = [None,None,None,None]
+            newmats = [] # materials not in the cache that use the generic up array; Hugoniots made together below
+            newlayers = [] # layers with Hugoniots made in this call; checked below before they are cached
+            for ilayer, wmat in enumerate([wmat1,wmat2,wmat3,wmat4]):
+                idmat = mat_index.get(wmat.value) # None if no material selected
+                if idmat is None:
+                    continue
+                matkeys[ilayer] = (ilayer+1,wmat.value,wusemgmodel.value,velgrid)
+                if matkeys[ilayer] in matcache:
+                    mats[ilayer] = matcache[matkeys[ilayer]] # Hugoniot already made for these inputs
+                    continue
+                mat = IM.Material()
+                mat.DefineParamsID(wmat.value,matdata,imat,idx=idmat)
+                if wusemgmodel.value and (mat.rho0 < 5000):
                     # if using MG model, increase the length of the particle velocity array
-                    uparr_factor = 5. # make up arrays up to impvel_factor*vel 
+                    uparr_factor_mg = 5. # make up arrays up to impvel_factor*vel 
                     if webappbool:
-                        uparr_length = 1000 # small memory limit for web app
+                        uparr_length_mg = 1000 # small memory limit for web app
                     else:
-                        uparr_length = 5000
+                        uparr_length_mg = 5000
                     #uparr_length = 5000. # number of points (resolution) of the up array
-                    upmat1 = np.arange(0,uparr_length+1)/uparr_length*vel*uparr_factor # m/s
-                else:
-                    upmat1 = np.copy(upgeneral) # each material is an independent set of arrays
-                mat1.MakeHugoniot(upmat1)
-                ind = np.where(mat1.hug.parr < 0)[0]
-                if len(ind)>0:
-                    winfo.value = 'No plot. Material 1 Hugoniot has negative values for requested calculation. Check material parameters. Max value in particle velocity array (km/s)='+str(max(upmat1/1.e3))
-                    return                   
-                if (wshowdata.value) and (mat1.ihed.id > -1):
-                    mat1.GetIHED(uselocalbool=wuselocaldata.value)
-
-            id2 = np.where(matdata.loc[:,'Material'].values == wmat2.value)[0]
-            if len(id2)>0:
-                mat2 = IM.Material()
-                mat2.DefineParamsID(wmat2.value,matdata,imat)
-                if wusemgmodel.value and (mat2.rho0 < 5000):
-                    # if using MG model, increase the length of the particle velocity array
-                    uparr_factor = 5. # make up arrays up to impvel_factor*vel 
-                    if webappbool:
-                        uparr_length = 1000 # small memory limit for web app
-                    else:
-                        uparr_length = 5000
-                    upmat2 = np.arange(0,uparr_length+1)/uparr_length*vel*uparr_factor # m/s
-                else:
-                    upmat2 = np.copy(upgeneral)
-                mat2.MakeHugoniot(upmat2)
-                ind = np.where(mat2.hug.parr < 0)[0]
-                if len(ind)>0:
-                    winfo.value = 'No plot. Material 2 Hugoniot has negative values for requested calculation. Check material parameters. Max value in particle velocity array (km/s)='+str(max(upmat2/1.e3))
-                    return                   
-                if wshowdata.value and (mat2.ihed.id > -1):
-                    mat2.GetIHED(uselocalbool=wuselocaldata.value)
-
-            id3 = np.where(matdata.loc[:,'Material'].values == wmat3.value)[0]
-            if len(id3)>0:
-                mat3 = IM.Material()
-                mat3.DefineParamsID(wmat3.value,matdata,imat)
-                if wusemgmodel.value and (mat3.rho0 < 5000):
-                    # if using MG model, increase the length of the particle velocity array
-                    uparr_factor = 5. # make up arrays up to impvel_factor*vel 
-                    if webappbool:
-                        uparr_length = 1000 # small memory limit for web app
-                    else:
-                        uparr_length = 5000
-                    upmat3 = np.arange(0,uparr_length+1)/uparr_length*vel*uparr_factor # m/s
-                else:
-                    upmat3 = np.copy(upgeneral)
-                mat3.MakeHugoniot(upmat3)
-                ind = np.where(mat3.hug.parr < 0)[0]
-                if len(ind)>0:
-                    winfo.value = 'No plot. Material 3 Hugoniot has negative values for requested calculation. Check material parameters. Max value in particle velocity array (km/s)='+str(max(upmat3/1.e3))
-                    return                   
-                if wshowdata.value and (mat3.ihed.id > -1):
-                    mat3.GetIHED(uselocalbool=wuselocaldata.value)
-
-            id4 = np.where(matdata.loc[:,'Material'].values == wmat4.value)[0]
-            if len(id4)>0:
-                if len(id3) == 0:
-                    # missing material 3 so stop
-                    winfo.value = 'No plot. Missing material 3'
-                    return                   
-                mat4 = IM.Material()
-                mat4.DefineParamsID(wmat4.value,matdata,imat)
-                if wusemgmodel.value and (mat4.rho0 < 5000):
-                    # if using MG model, increase the length of the particle velocity array
-                    uparr_factor = 5. # make up arrays up to impvel_factor*vel 
-                    if webappbool:
-                        uparr_length = 1000 # small memory limit for web app
-                    else:
-                        uparr_length = 5000
-                    upmat4 = np.arange(0,uparr_length+1)/uparr_length*vel*uparr_factor # m/s
+                    mat.MakeHugoniot(UpArray(uparr_length_mg,velgrid*uparr_factor_mg)) # m/s
                 else:
-                    upmat4 = np.copy(upgeneral)
-                mat4.MakeHugoniot(upmat4)
-                ind = np.where(mat4.hug.parr < 0)[0]
-                if len(ind)>0:
-                    winfo.value = 'No plot. Material 4 Hugoniot has negative values for requested calculation. Check material parameters. Max value in particle velocity array (km/s)='+str(max(upmat4/1.e3))
+                    newmats.append(mat)
+                mats[ilayer] = mat
+                newlayers.append(ilayer)
+            if len(newmats) > 0:
+                # same read-only up array for all these materials
+                IM.MakeHugoniotBatch(newmats,UpArray(uparr_length,velgrid*uparr_factor)) # m/s
+            # only valid Hugoniots are cached, so materials from the cache are not checked again
+            for ilayer in newlayers:
+                mat = mats[ilayer]
+                if np.any(mat.hug.parr < 0):
+                    winfo.value = 'No plot. Material '+str(ilayer+1)+' Hugoniot has negative values for requested calculation. Check material parameters. Max value in particle velocity array (km/s)='+str(max(mat.hug.uparr/1.e3))
                     return                   
-                if wshowdata.value and (mat4.ihed.id > -1):
-                    mat4.GetIHED(uselocalbool=wuselocaldata.value)
-
-            del(upgeneral) # don't need it anymore
-            # check that at least 2 materials have been defined
-            if len(id1)==0 or len(id2)==0:
-                winfo.value = '\nNO PLOT. Need materials 1 and 2.'
-                return
+                cache_material(matkeys[ilayer],mat)
+            if wshowdata.value:
+                # load IHED data for the materials that do not have it yet
+                ihedmats = [mat for mat in mats if (mat is not None) and (mat.ihed.id > -1) and (mat.ihed.matname == '')]
+                ihedids = list(set(mat.ihed.id for mat in ihedmats))
+                if len(ihedids) > 1:
+                    # the downloads are I/O bound, so fetch the tables at the same time; GetIHED then reuses them
+                    with ThreadPoolExecutor(max_workers=4) as executor:
+                        list(executor.map(lambda ihedid: IM.ReadIHED(ihedid,uselocalbool=wuselocaldata.value),ihedids))
+                for mat in ihedmats:
+                    mat.GetIHED(uselocalbool=wuselocaldata.value)
+            mat1, mat2 = mats[0], mats[1] # both defined (checked above); optional materials 3 and 4 are handled layer by layer below
 
             #---------------------------------------------------------------------------
             # DO THE IM MATCH MATH FIRST AND THEN PLOT IF ALL CALCS SUCCESSFUL
             # SOLVE FOR FIRST IM STATE: mat1--> mat2 at vel
-            if len(id1) >0 and len(id2)>0:
-                # solve for first impedance match state mat1--> mat2 at vel
-                IM12_success = mat1.IM_match(mat2,vel=vel)
-                if not IM12_success:
-                    message_txt = '<p>NO PLOT. Impedance match between mats 1 and 2 failed.'
-                    winfo.value = message_txt
-                    return
-                string_IM_res = string_IM_res + '<p>'+mat1.name+' &#8594; '+mat2.name
-                string_IM_res = string_IM_res + '<p>&emsp;'+mat1.name+' '+str(mat1.im1)
-                string_IM_res = string_IM_res + '<p>&emsp;'+mat2.name+' '+str(mat2.im1)
-                
-            if len(id3)>0:
-                # solve for second impedance match state mat2 -> mat3
-                IM23_success = mat2.IM_match(mat3,pstart=mat2.im1,usemgmodelbool=usemgmodel,vel=vel)
-                if not IM12_success:
-                    message_txt = '<p>NO PLOT. Impedance match between mats 2 and 3 failed.'
-                    if usemgmodel:
-                        message_txt = message_txt+' Turn off Mie-Grueneisen model.'
-                    winfo.value = message_txt
-                    return
-                string_IM_res = string_IM_res + '<p>'+mat2.name+' &#8594; '+mat3.name
-                string_IM_res = string_IM_res + '<p>&emsp;'+mat2.name+' '+str(mat2.im2)
-                string_IM_res = string_IM_res + '<p>&emsp;'+mat3.name+' '+str(mat3.im1)
-
-            if len(id4)>0:
-                # solve for third impedance match state mat3 -> mat4
-                IM34_success = mat3.IM_match(mat4,pstart=mat3.im1,usemgmodelbool=usemgmodel,vel=vel)
-                if not IM34_success:
-                    message_txt = '<p>NO PLOT. Impedance match between mats 3 and 4 failed.'
+            IM12_success = mat1.IM_match(mat2,vel=vel)
+            if not IM12_success:
+                message_txt = '<p>NO PLOT. Impedance match between mats 1 and 2 failed.'
+                winfo.value = message_txt
+                return
+            IM_res_lines.append('<p>'+mat1.name+' &#8594; '+mat2.name)
+            IM_res_lines.append('<p>&emsp;'+mat1.name+' '+str(mat1.im1))
+            IM_res_lines.append('<p>&emsp;'+mat2.name+' '+str(mat2.im1))
+
+            # SOLVE FOR THE OPTIONAL DOWNSTREAM IM STATES: mat2 -> mat3, then mat3 -> mat4
+            # the driver material reshocks or releases into the receiver material initially at rest
+            for ilayer in (2,3):
+                driver, receiver = mats[ilayer-1], mats[ilayer]
+                if receiver is None:
+                    break
+                IM_success = driver.IM_match(receiver,pstart=driver.im1,usemgmodelbool=usemgmodel,vel=vel)
+                if not IM_success:
+                    message_txt = '<p>NO PLOT. Impedance match between mats '+str(ilayer)+' and '+str(ilayer+1)+' failed.'
                     if usemgmodel:
                         message_txt = message_txt+' Turn off Mie-Grueneisen model.'
                     winfo.value = message_txt
                     return
-                string_IM_res = string_IM_res + '<p>'+mat3.name+' &#8594; '+mat4.name
-                string_IM_res = string_IM_res + '<p>&emsp;'+mat3.name+' '+str(mat3.im2)
-                string_IM_res = string_IM_res + '<p>&emsp;'+mat4.name+' '+str(mat4.im1)
+                IM_res_lines.append('<p>'+driver.name+' &#8594; '+receiver.name)
+                IM_res_lines.append('<p>&emsp;'+driver.name+' '+str(driver.im2))
+                IM_res_lines.append('<p>&emsp;'+receiver.name+' '+str(receiver.im1))
 
             #---------------------------------------------------------------------------
             # MAKE PLOT
             # if at this point, the IM_match calculations should all be successful
-            fig = plt.figure() # initialize the figure object
-            def on_button_clicked(b):
-                fig.savefig(wfilename.value,bbox_inches='tight',dpi=300)
-            wbutton.on_click(on_button_clicked) # if the save button is clicked, save the figure to a file
+            ax.cla() # clear the figure from the last redraw
+            ax.tick_params(labelsize=fontsize) # cla resets the tick labels from the global rcParams
+            velkms = vel/1.e3 # impact velocity in km/s for plot and labels
 
             # plot flyer, target Hugoniots and IM point
-            plt.plot((vel-mat1.hug.uparr)/1.e3,mat1.hug.parr/1.e9,label='Mat1 '+wmat1.value+' Hug.')
-            plt.plot(mat2.hug.uparr/1.e3,mat2.hug.parr/1.e9,label='Mat2 '+wmat2.value+' Hug.')
-            plt.plot(mat2.im1.up/1.e3,mat2.im1.p/1.e9,'D',color='black',label='IM Mat2')
+            ax.plot(velkms-mat1.hug.uparr_kms,mat1.hug.parr_gpa,label='Mat1 '+wmat1.value+' Hug.')
+            ax.plot(mat2.hug.uparr_kms,mat2.hug.parr_gpa,label='Mat2 '+wmat2.value+' Hug.')
+            ax.plot(mat2.im1.up/1.e3,mat2.im1.p/1.e9,'D',color='black',label='IM Mat2')
             #string1 = wmat1.value+' impacts '+wmat2.value+' at '+str(vel/1.e3)+' km/s\nImp. Match Mat2: Up='+IM.ClStr(mat2.im1.up/1.e3)+' (km/s) P='+IM.ClStr(mat2.im1.p/1.e9)+' (GPa)'
-            string1 = 'Shock Impedance Match Tool\nImpact velocity '+str(vel/1.e3)+' km/s'
+            string1 = 'Shock Impedance Match Tool\nImpact velocity '+str(velkms)+' km/s'
             
-            if (wshowdata.value) and (mat1.ihed.id > -1):
-                indm1=np.where(mat1.ihed.marr == 1.)
-                if mat1.name == 'Ice':
-                    indm1 = np.where(mat1.ihed.marr == 1.093)[0] # IHED used liquid water density
-                plt.scatter(vel/1.e3-mat1.ihed.uparr[indm1]/1.e3,mat1.ihed.parr[indm1]/1.e9,label=mat1.ihed.matname)
-                indm1=np.where(mat2.ihed.marr == 1.)
-            if (wshowdata.value) and (mat2.ihed.id > -1):               
-                if mat2.name == 'Ice':
-                    indm1 = np.where(mat2.ihed.marr == 1.093)[0] # IHED used liquid water density
-                plt.scatter(mat2.ihed.uparr[indm1]/1.e3,mat2.ihed.parr[indm1]/1.e9,label=mat2.ihed.matname)
-
-            if len(id3)>0:
-                # optional third material included
-                # plot mat3 principal Hugoniot
-                plt.plot(mat3.hug.uparr/1.e3,mat3.hug.parr/1.e9,label='Mat3 '+wmat3.value+' Hug.')
-                if wshowdata.value and (mat3.ihed.id > -1):
-                    indm1=np.where(mat3.ihed.marr == 1.)
-                    if mat3.name == 'Ice':
-                        indm1 = np.where(mat3.ihed.marr == 1.093)[0] # IHED used liquid water density
-                    plt.scatter(mat3.ihed.uparr[indm1]/1.e3,mat3.ihed.parr[indm1]/1.e9,label=mat3.ihed.matname)
-
-                if mat2.im2.p > mat2.im1.p:
-                    # reshock material 2
-                    plt.plot(mat2.reshock.uparr/1.e3,mat2.reshock.parr/1.e9,label='Mat2 Reshock')
-                    string3B = ' RESHOCK'
-                else:
-                    # release material 2
-                    plt.plot((2*mat2.im1.up-mat2.isen.uparr)/1.e3,mat2.isen.parr/1.e9,label='Mat2 Isentrope')
-                    string3B = ' RELEASE'
-                plt.plot(mat3.im1.up/1.e3,mat3.im1.p/1.e9,'D',label='IM Mat3')
- 
-                string3=''
-                #if usemgmodel:
-                #    string3 = '\nImp. Match Mat3 (MG): Up='+IM.ClStr(mat3.im1.up/1.e3)+' (km/s) P='+IM.ClStr(mat3.im1.p/1.e9)+' (GPa)'+string3B
-                #else:
-                #    string3 = '\nImp. Match Mat3 (HUG): Up='+IM.ClStr(mat3.im1.up/1.e3)+' (km/s) P='+IM.ClStr(mat3.im1.p/1.e9)+' (GPa)'+string3B
-                
-            if len(id4)>0:
-                # optional fourth material included
-                # plot mat4 principal Hugoniot
-                plt.plot(mat4.hug.uparr/1.e3,mat4.hug.parr/1.e9,label='Mat4 '+wmat4.value+' Hug.')
-                if (wshowdata.value) and (mat4.ihed.id > -1):               
-                    indm1=np.where(mat4.ihed.marr == 1.)
-                    if mat4.name == 'Ice':
-                        indm1 = np.where(mat4.ihed.marr == 1.093)[0] # IHED used liquid water density
-                    plt.scatter(mat4.ihed.uparr[indm1]/1.e3,mat4.ihed.parr[indm1]/1.e9,label=mat4.ihed.matname)
-
-                if mat3.im2.p > mat3.im1.p:
-                    # reshock material 3
-                    plt.plot(mat3.reshock.uparr/1.e3,mat3.reshock.parr/1.e9,label='Mat3 Reshock')
-                    string4B = ' RESHOCK'
+            # IHED data are drawn as line markers, which are cheaper to build and draw than scatter collections;
+            # explicit colors keep the separate color sequence (C0, C1, ...) that scatter used for the data sets
+            idata = 0
+            if plot_ihed_bool(mat1):
+                ax.plot(velkms-mat1.ihed.upplot,mat1.ihed.pplot,'o',color='C'+str(idata),label=mat1.ihed.matname) # nonporous data points
+                idata += 1
+            if plot_ihed_bool(mat2):
+                ax.plot(mat2.ihed.upplot,mat2.ihed.pplot,'o',color='C'+str(idata),label=mat2.ihed.matname) # nonporous data points
+                idata += 1
+
+            for ilayer in (2,3):
+                # optional third and fourth materials included
+                driver, receiver = mats[ilayer-1], mats[ilayer]
+                if receiver is None:
+                    break
+                # plot receiver principal Hugoniot
+                ax.plot(receiver.hug.uparr_kms,receiver.hug.parr_gpa,label='Mat'+str(ilayer+1)+' '+receiver.name+' Hug.')
+                if plot_ihed_bool(receiver):
+                    ax.plot(receiver.ihed.upplot,receiver.ihed.pplot,'o',color='C'+str(idata),label=receiver.ihed.matname) # nonporous data points
+                    idata += 1
+
+                if driver.im2.p > driver.im1.p:
+                    # reshock driver material
+                    ax.plot(driver.reshock.uparr/1.e3,driver.reshock.parr/1.e9,label='Mat'+str(ilayer)+' Reshock')
                 else:
-                    # release material 3
-                    plt.plot((2*mat3.im1.up-mat3.isen.uparr)/1.e3,mat3.isen.parr/1.e9,label='Mat3 Isentrope')
-                    string4B = ' RELEASE'
-                plt.plot(mat4.im1.up/1.e3,mat4.im1.p/1.e9,'D',label='IM Mat4')
-
-                string4=''
-                #if usemgmodel:
-                #    string4 = '\nImp. Match Mat4 (MG): Up='+IM.ClStr(mat4.im1.up/1.e3)+' (km/s) P='+IM.ClStr(mat4.im1.p/1.e9)+' (GPa)'+string4B
-                #else:
-                #    string4 = '\nImp. Match Mat4 (HUG): Up='+IM.ClStr(mat4.im1.up/1.e3)+' (km/s) P='+IM.ClStr(mat4.im1.p/1.e9)+' (GPa)'+string4B
-
-            plt.title(string1+string2+string3+string4)            
-            plt.legend(bbox_to_anchor=(1,1), loc="upper left") #bbox_to_anchor=(1.05, 1)
-            plt.xlabel('Particle Velocity (km/s)\nhttps://impactswiki.net/impact-tools-book/')
-            plt.ylabel('Pressure (GPa)')
-            if wpmax.value > 0: # don't use negative values
-                plt.ylim(0,wpmax.value)
-            else:
-                plt.ylim(0,pmaxfactor*mat1.im1.p/1.e9)
-            if wupmax.value > 0:
-                plt.xlim(0,wupmax.value)
-            else:
-                plt.xlim(0,upmaxfactor*vel/1.e3)
-            plt.tight_layout()
+                    # release driver material
+                    isenlabel = 'Mat'+str(ilayer)+' Isentrope'
+                    if driver.im2.p == driver.im1.p:
+                        # equal impedance: the wave passes through unchanged and the isentrope runs through the matched state
+                        isenlabel += ' (equal impedance, no reflected wave)'
+                    ax.plot(driver.isen.uprefl/1.e3,driver.isen.parr/1.e9,label=isenlabel)
+                ax.plot(receiver.im1.up/1.e3,receiver.im1.p/1.e9,'D',label='IM Mat'+str(ilayer+1))
+
+            ax.set_title(string1+string2+string3+string4,fontsize=titlesize)            
+            ax.legend(bbox_to_anchor=(1,1), loc="upper left",fontsize=fontsize) #bbox_to_anchor=(1.05, 1)
+            ax.set_xlabel('Particle Velocity (km/s)\nhttps://impactswiki.net/impact-tools-book/',fontsize=fontsize)
+            ax.set_ylabel('Pressure (GPa)',fontsize=fontsize)
+            autolimits['pmax'] = pmaxfactor*mat1.im1.p/1.e9
+            autolimits['upmax'] = upmaxfactor*velkms
+            set_plot_limits()
             if usemgmodel:
                 userinfostr = userinfostr + ' Mie-Grueneisen model for reshock and release.'
             else:
                 userinfostr = userinfostr + ' Hugoniot for reshock and release.'
             #userinfostr = userinfostr + ' '+str(len(mat1.hug.uparr))+' '+str(len(mat2.hug.uparr))+' '
-            winfo.value = '<p>Impact velocity '+IM.ClStr(vel/1.e3)+' (km/s).'+userinfostr+string_IM_res+'<p>IM Tool v'+IM.__version__
-            plt.close(fig)
-            return fig
+            winfo.value = '<p>Impact velocity '+IM.ClStr(velkms)+' (km/s).'+userinfostr+''.join(IM_res_lines)+'<p>IM Tool v'+IM.__version__
+            wfigure.param.trigger('object') # same figure object, so tell the pane to redraw it
+            return wfigure
 
     wplot=pn.panel(match_and_plot, sizing_mode='scale_width') # panel to display the impedance match plot
 
@@ -402,7 +378,8 @@ def IM_app(webappbool=False):
     # Widgets below the main IM Tool
     #-----------------------------------------------------------------------------
     # Toggle Pane: display current matdata DataFrame
-    wdf_widget = pn.widgets.Tabulator(matdata)
+    # remote pagination: only the visible page of the database is sent to the browser (this card starts collapsed)
+    wdf_widget = pn.widgets.Tabulator(matdata, pagination='remote', page_size=25)
 
     #-----------------------------------------------------------------------------
     # Toggle Pane: Add or Remove Material
@@ -424,39 +401,44 @@ def IM_app(webappbool=False):
     wnote = pn.widgets.TextInput(name='Note', value='Enter reference for material parameters.')
     waddmatbutton = pn.widgets.Button(name='Add material to database', button_type='primary')
   
+    def update_material_lists():
+        # update all the material listings and the name lookup after matdata changes
+        nonlocal mat_index
+        mat_index = IM.MaterialNameIndex(matdata)
+        matcache.clear() # cached materials may refer to old rows
+        wdf_widget.value = matdata
+        material_names = list(matdata['Material'].to_numpy()) # read the name column once for all the menus
+        ab_materials = ['Choose material'] + material_names   # empty material at the top of the list
+        wmat1.options=ab_materials
+        wmat2.options=ab_materials
+        bc_materials = ['Choose material / No material'] + material_names   # empty material at the top of the list
+        wmat3.options=bc_materials
+        wmat4.options=bc_materials
+        wmat_drop.options=material_names
+        wmat_ihed.options=material_names
+
     @pn.depends(wmat1,wmat2,wmat3,wmat4,wmat_drop,wmat_ihed)
     def on_addmatbutton_clicked(event):
-        # somebody please tell me the better way to access these variables in a button function....
-        global matdata
+        nonlocal matdata
         # load an empty new material parameter DataFrame
         # Columns must match the original materials-data.csv file
         newmatdata, imat = IM.ReadMaterials(matfilename='materials-new.csv')
-        newmatdata.iloc[:,imat.name] = wnewname.value
-        newmatdata.iloc[:,imat.rho0] = wrho0.value
-        newmatdata.iloc[:,imat.c0] = wc0.value
-        newmatdata.iloc[:,imat.s1] = ws1.value
-        newmatdata.iloc[:,imat.s2] = ws2.value
-        newmatdata.iloc[:,imat.d] = wd.value
-        newmatdata.iloc[:,imat.g0] = wg0.value
-        newmatdata.iloc[:,imat.q] = wq.value
-        newmatdata.iloc[:,imat.ihed] = wihed.value
+        cols = newmatdata.columns
+        row = newmatdata.iloc[0].to_dict() # blank template values; filled in below and made into one DataFrame row
+        row[cols[imat.name]] = wnewname.value
+        row[cols[imat.rho0]] = wrho0.value
+        row[cols[imat.c0]] = wc0.value
+        row[cols[imat.s1]] = ws1.value
+        row[cols[imat.s2]] = ws2.value
+        row[cols[imat.d]] = wd.value
+        row[cols[imat.g0]] = wg0.value
+        row[cols[imat.q]] = wq.value
+        row[cols[imat.ihed]] = wihed.value
         dt = datetime.now()        
-        newmatdata.iloc[:,imat.date] = dt.strftime('%Y-%m-%d')
-        newmatdata.iloc[:,imat.note] = wnote.value
-        matdata = pd.concat([newmatdata,matdata],ignore_index=True)
-        # update all the material listings
-        wdf_widget.value = matdata
-        ab_materials = list(matdata.loc[:,'Material'].values)
-        ab_materials.insert(0, 'Choose material')   # empty material at the top of the list
-        wmat1.options=ab_materials
-        wmat2.options=ab_materials
-        bc_materials = list(matdata.loc[:,'Material'].values)
-        bc_materials.insert(0, 'Choose material/nomaterial')   # empty material at the top of the list
-        wmat3.options=bc_materials
-        wmat4.options=bc_materials
-        all_materials = list(matdata.loc[:,'Material'].values)
-        wmat_drop.options=all_materials
-        wmat_ihed.options=all_materials
+        row[cols[imat.date]] = dt.strftime('%Y-%m-%d')
+        row[cols[imat.note]] = wnote.value
+        matdata = pd.concat([pd.DataFrame([row],columns=cols),matdata],ignore_index=True)
+        update_material_lists()
         
     waddmatbutton.on_click(on_addmatbutton_clicked)
     
@@ -465,25 +447,12 @@ def IM_app(webappbool=False):
     @pn.depends(wmat1,wmat2,wmat3,wmat4,wmat_drop,wmat_ihed)
     def on_dropmatbutton_clicked(event):
         #print('CLICKED BUTTON')
-        # somebody please tell me the better way to access these variables in a button function....
-        global matdata
+        nonlocal matdata
         # load an empty new material parameter DataFrame
         # Columns must match the original materials-data.csv file
-        idx = np.where(matdata.loc[:,'Material'].values == wmat_drop.value)[0]
-        matdata = matdata.drop(index=idx)
-        # update all the material listings
-        wdf_widget.value = matdata
-        ab_materials = list(matdata.loc[:,'Material'].values)
-        ab_materials.insert(0, 'Choose material')   # empty material at the top of the list
-        wmat1.options=ab_materials
-        wmat2.options=ab_materials
-        bc_materials = list(matdata.loc[:,'Material'].values)
-        bc_materials.insert(0, 'Choose material/nomaterial')   # empty material at the top of the list
-        wmat3.options=bc_materials
-        wmat4.options=bc_materials
-        all_materials = list(matdata.loc[:,'Material'].values)
-        wmat_drop.options=all_materials
-        wmat_ihed.options=all_materials
+        idx = np.where(matdata['Material'].to_numpy() == wmat_drop.value)[0]
+        matdata = matdata.drop(index=matdata.index[idx]) # row positions -> index labels (labels have gaps after a drop)
+        update_material_lists()
     wremovematbutton = pn.widgets.Button(name='Remove material from database', button_type='primary')
     wremovematbutton.on_click(on_dropmatbutton_clicked)
     
@@ -493,17 +462,19 @@ def IM_app(webappbool=False):
 
     #-----------------------------------------------------------------------------
     # Toggle Pane: plot material
+    # one figure for the material plot, redrawn in place on every update
+    with plt.rc_context({'font.size':fontsize}):
+        fig_mat, ax_mat = plt.subplots(figsize=figsize,dpi=100)
+    plt.close(fig_mat)
+    wfigure_mat = pn.pane.Matplotlib(fig_mat, sizing_mode='scale_width') # pane that displays the figure
     @pn.depends(wmat_ihed)
     def plot_mat(mat_ihed=wmat_ihed):
-        # somebody please tell me the better way to access these variables in a function....
-        global matdata,imat
         # load an empty new material parameter DataFrame
         # Columns must match the original materials-data.csv file
-        idx = np.where(matdata.loc[:,'Material'].values == wmat_ihed.value)[0]
+        idx = mat_index.get(wmat_ihed.value)
         matplot = IM.Material()
-        matplot.DefineParamsID(wmat_ihed.value,matdata,imat)
+        matplot.DefineParamsID(wmat_ihed.value,matdata,imat,idx=idx)
         upplot = np.arange(0,15000,50)
-        matplot.MakeHugoniot(upplot)
         if matplot.ihed.id >0:
             matplot.GetIHED(uselocalbool=wuselocaldata.value)
             if matplot.ihed.d != 0:
@@ -512,56 +483,50 @@ def IM_app(webappbool=False):
                 lab_txt = 'IHED quadratic fit'
             else:
                 lab_txt = 'IHED linear fit'
-            ind = np.where(matplot.ihed.marr == 1.0)[0] # don't plot porous data 
-            if matplot.name == 'Ice':
-                ind = np.where(matplot.ihed.marr == 1.093)[0] # for some reason IHED did not use ice's actual density
+            ind = matplot.ihed.plotind # don't plot porous data; for some reason IHED did not use ice's actual density
             if len(ind)>0:
                 up = matplot.ihed.uparr[ind]
                 us = matplot.ihed.usarr[ind]
-                if matplot.ihed.d==0:
-                    diff = us-(matplot.c0+matplot.s1*up+matplot.s2*up*up)
-                else:
-                    diff = us-(matplot.c0+matplot.s1*up-matplot.s2*up*np.exp(-matplot.d*up))
-            # remake uparr and Hugoniot to reach largest value in IHED database
-            if len(ind)>0:
+                # make uparr to reach largest value in IHED database
                 upplot = np.arange(0,max(up),50)
-                matplot.MakeHugoniot(upplot)
+        matplot.MakeHugoniot(upplot) # hug.usarr is the primary Hugoniot fit in the plot
 
         paramstring = 'r$_0$='+IM.ClStr(matplot.rho0/1.e3)+' (g/cm$^3$), Us (km/s)='+IM.ClStr(matplot.c0/1.e3)+'+'+IM.ClStr(matplot.s1)+'up'
-        if (matplot.s2 != 0) and (matplot.d == 0): # s2 is s/m -> s/km
+        if matplot.hugform == 2: # quadratic; s2 is s/m -> s/km
             if matplot.s2<0:
                 paramstring += str(matplot.s2*1.e3)+'up$^2$'
             if matplot.s2>0:
                 paramstring += '+'+str(matplot.s2*1.e3)+'up$^2$'
-        if (matplot.d != 0): # s2 is dimless and d is s/m -> s/km
+        if matplot.hugform == 3: # universal liquid; s2 is dimless and d is s/m -> s/km
             if matplot.s2<0:
                 paramstring += IM.ClStr(matplot.s2)+'up exp(-'+str(matplot.d*1.e3)
             if matplot.s2>0:
                 paramstring += '+'+IM.ClStr(matplot.s2)+'up exp(-'+str(matplot.d*1.e3)+'up)'
         # BEGIN PLOT HERE
-        fig = plt.figure() # initialize the figure object
+        ax_mat.cla() # clear the figure from the last material
+        ax_mat.tick_params(labelsize=fontsize) # cla resets the tick labels from the global rcParams
         labelstr=''
-        if matplot.d == 0:
-            if matplot.s2 ==0:
+        if matplot.hugform in [1,2]:
+            if matplot.hugform == 1:
                 labelstr = 'Primary Linear Hugoniot fit'
             else:
                 labelstr = 'Primary Quadratic Hugoniot fit'
-            plt.plot(upplot/1000.,(matplot.c0+matplot.s1*upplot+matplot.s2*upplot*upplot)/1000.,'--',label=labelstr)
+            ax_mat.plot(upplot/1000.,matplot.hug.usarr/1000.,'--',label=labelstr)
         else:
-            plt.plot(upplot/1000.,(matplot.c0+matplot.s1*upplot-matplot.s2*upplot*np.exp(-matplot.d*upplot))/1000.,'--',label='Primary UL Hugoniot fit')        
+            ax_mat.plot(upplot/1000.,matplot.hug.usarr/1000.,'--',label='Primary UL Hugoniot fit')        
         if (matplot.ihed.id >0) and (len(ind)>0): 
-            plt.scatter(up/1000.,us/1000.,label='IHED '+matplot.ihed.matname)
+            ax_mat.plot(up/1000.,us/1000.,'o',color='C0',label='IHED '+matplot.ihed.matname) # line markers, same color scatter used
         
         #print('Primary Hugoniot parameters c0,s1,s2(or c),d=',matplot.c0,matplot.s1,matplot.s2,matplot.d)
-        plt.xlabel('Particle Velocity (km/s)')
-        plt.ylabel('Shock Velocity (km/s)')
+        ax_mat.set_xlabel('Particle Velocity (km/s)',fontsize=fontsize)
+        ax_mat.set_ylabel('Shock Velocity (km/s)',fontsize=fontsize)
         if matplot.ihed.id>0:
-            plt.title('Material = '+matplot.name+', IHED ID '+str(matplot.ihed.id)+' '+matplot.ihed.matname+'\n'+paramstring)
+            ax_mat.set_title('Material = '+matplot.name+', IHED ID '+str(matplot.ihed.id)+' '+matplot.ihed.matname+'\n'+paramstring,fontsize=titlesize)
         else:
-            plt.title('Material = '+matplot.name+', NO IHED ID \n'+paramstring)
-        plt.legend()
-        plt.close(fig)
-        return fig
+            ax_mat.set_title('Material = '+matplot.name+', NO IHED ID \n'+paramstring,fontsize=titlesize)
+        ax_mat.legend(fontsize=fontsize)
+        wfigure_mat.param.trigger('object') # same figure object, so tell the pane to redraw it
+        return wfigure_mat
 
     wfig_mat=pn.panel(plot_mat, sizing_mode='scale_width') # panel to display the impedance match plot
 
@@ -581,15 +546,17 @@ def IM_app(webappbool=False):
     wupmaxihed = pn.widgets.FloatInput(name='Up max for fit [m/s] (set to 1e99 for full range)', value=1.e99, page_step_multiplier=1)
     wg0ihed = pn.widgets.FloatInput(name='g0 [-]', value=1., page_step_multiplier=1)
     wqihed = pn.widgets.FloatInput(name='q [-]', value=1., page_step_multiplier=1)
+    fitformflags = {'Linear':1,'Quadratic':2,'Universal Liquid':3} # menu entry -> Hugoniot form flag for FitUsUp
     wfitform=pn.widgets.Select(
         name='Select Hugoniot equation',
-        options=['Linear','Quadratic','Universal Liquid'],
+        options=list(fitformflags),
     )
     
     wfitihedbutton = pn.widgets.Button(name='Fit IHED data', button_type='primary')
+    matihed = None # material made by the last IHED fit; added to the database by waddihedbutton
     @pn.depends(wfitihedbutton,wfitform)
     def on_fitihedbutton_clicked(event,fitform=wfitform):
-        global matihed
+        nonlocal matihed
         
         #print('CLICKED FIT BUTTON')
         if waddihedid.value <=0:
@@ -597,56 +564,56 @@ def IM_app(webappbool=False):
             # no ihed number provided, so no figure
             return
         # get form
-        if wfitform.value == 'Linear':
-            formflag=1
-        elif wfitform.value == 'Quadratic':
-            formflag=2
-        elif wfitform.value == 'Universal Liquid':
-            formflag=3
-            
+        formflag = fitformflags[wfitform.value]
+
         matihed = IM.Material()
         matihed.ihed.id = waddihedid.value
         matihed.name = wnewnameihed.value
         matihed.GetIHED()
-        uparr = np.copy(matihed.ihed.uparr)
-        usarr = np.copy(matihed.ihed.usarr)
         # fit the nonporous data
-        ind = np.where( (matihed.ihed.uparr > wupminihed.value) & (matihed.ihed.uparr < wupmaxihed.value) & (matihed.ihed.marr == 1.0))[0]
         if matihed.ihed.matname == 'Ice':
-            ind = np.where( (matihed.ihed.uparr > wupminihed.value) & (matihed.ihed.uparr < wupmaxihed.value) & (matihed.ihed.marr == 1.093))[0]
+            mfit = 1.093 # IHED used liquid water density
+        else:
+            mfit = 1.0
+        fitmask = (matihed.ihed.uparr > wupminihed.value) & (matihed.ihed.uparr < wupmaxihed.value) & (matihed.ihed.marr == mfit)
+        upfit = matihed.ihed.uparr[fitmask] # m/s
+        usfit = matihed.ihed.usarr[fitmask] # m/s
         #print('len up, us',len(uparr),len(usarr))
         #uparr = np.arange(101)/100.*10000 # m/s
         #usarr = 4000+1.4*uparr # m/s
-        fitparams = IM.FitUsUp(uparr[ind],usarr[ind],formflag=formflag)
+        fitparams = IM.FitUsUp(upfit,usfit,formflag=formflag)
         if len(fitparams) == 1:
             print('error with fit')
             return
         #print('fitform = ',formflag)
         # BEGIN PLOT HERE
-        fig = plt.figure() # initialize the figure object
+        fig = plt.figure(figsize=figsize,dpi=100) # initialize the figure object
         labelstr=''
         fitstr = ''
-        upplot = np.sort(uparr[ind])
+        if formflag == 1:
+            upplot = np.array([min(upfit),max(upfit)]) # a line only needs its end points
+        else:
+            upplot = np.sort(upfit)
         if len(fitparams) == 2:
             labelstr = 'Primary Linear Hugoniot fit'
-            plt.plot(upplot/1000.,(fitparams[1]+fitparams[0]*upplot)/1000.,label=labelstr)
+            plt.plot(upplot/1000.,np.polyval(fitparams,upplot)/1000.,label=labelstr) # polyfit coefficients, highest order first
             fitstr = str(fitparams[1])+' + '+str(fitparams[0])+' u<sub>p</sub>'
         elif len(fitparams) == 3:
             labelstr = 'Quadratic Hugoniot fit'
-            plt.plot(upplot/1000.,(fitparams[2]+fitparams[1]*upplot+fitparams[0]*upplot*upplot)/1000.,label=labelstr)
+            plt.plot(upplot/1000.,np.polyval(fitparams,upplot)/1000.,label=labelstr)
             fitstr = str(fitparams[2])+' + '+str(fitparams[1])+' u<sub>p</sub> + '+str(fitparams[0])+' u<sub>p</sub><sup>2</sup>'
         elif len(fitparams) == 4:
-            plt.plot(upplot/1000.,(fitparams[0]+fitparams[1]*upplot-fitparams[2]*upplot*np.exp(-fitparams[3]*upplot))/1000.,label='Primary UL Hugoniot fit')
+            plt.plot(upplot/1000.,IM.UniversalHugoniot(upplot,*fitparams)/1000.,label='Primary UL Hugoniot fit') # same function used for the fit
             #  Us = A + B Up − C Up exp(−D Up)
             fitstr = str(fitparams[0])+' + '+str(fitparams[1])+' u<sub>p</sub> - '+str(fitparams[2])+' u<sub>p</sub> exp(-'+str(fitparams[3])+' u<sub>p</sub>)'
         #print('Primary Hugoniot parameters c0,s1,s2(or c),d=',matplot.c0,matplot.s1,matplot.s2,matplot.d)
-        plt.scatter(matihed.ihed.uparr[ind]/1.e3,matihed.ihed.usarr[ind]/1.e3,label='IHED data points')
+        plt.plot(upfit/1.e3,usfit/1.e3,'o',color='C0',label='IHED data points') # line markers, same color scatter used
         plt.xlabel('Particle Velocity (km/s)')
         plt.ylabel('Shock Velocity (km/s)')
         plt.title('Material = '+matihed.name+', IHED ID '+str(matihed.ihed.id)+' '+matihed.ihed.matname)
         plt.legend()
         plt.close(fig)
-        waddihedinfo.value = 'Fit complete. Only using nonporous points. Number of points = '+str(len(ind))+'.<p> Fit Us = '+fitstr
+        waddihedinfo.value = 'Fit complete. Only using nonporous points. Number of points = '+str(len(upfit))+'.<p> Fit Us = '+fitstr
         
         # add the parameters to the matihed object
         if formflag == 1:
@@ -668,11 +635,12 @@ def IM_app(webappbool=False):
         matihed.s1 = matihed.ihed.s1
         matihed.s2 = matihed.ihed.s2
         matihed.d  = matihed.ihed.d
+        matihed.hugform = formflag
         matihed.rho0 = matihed.ihed.rho0
         matihed.g0  = wg0ihed.value
         matihed.q  = wqihed.value
-        matihed.uplow = min(uparr[ind])
-        matihed.uphigh = max(uparr[ind])
+        matihed.uplow = min(upfit)
+        matihed.uphigh = max(upfit)
         return fig
         
     wfitihedbutton.on_click(on_fitihedbutton_clicked)
@@ -680,39 +648,28 @@ def IM_app(webappbool=False):
     
     def on_addihedbutton_clicked(event):
         print('CLICKED ADD BUTTON')
-        # somebody please tell me the better way to access these variables in a button function....
-        global matdata, matihed
+        nonlocal matdata
         # load an empty new material parameter DataFrame
         # Columns must match the original materials-data.csv file    
         newmatdata, imat = IM.ReadMaterials(matfilename='materials-new.csv')
-        newmatdata.iloc[:,imat.name] = matihed.name
-        newmatdata.iloc[:,imat.rho0] = matihed.rho0
-        newmatdata.iloc[:,imat.c0] = matihed.c0
-        newmatdata.iloc[:,imat.s1] = matihed.s1
-        newmatdata.iloc[:,imat.s2] = matihed.s2
-        newmatdata.iloc[:,imat.d] = matihed.d
-        newmatdata.iloc[:,imat.g0] = matihed.g0
-        newmatdata.iloc[:,imat.q] = matihed.q
-        newmatdata.iloc[:,imat.uplow] = matihed.uplow
-        newmatdata.iloc[:,imat.uphigh] = matihed.uphigh
-        newmatdata.iloc[:,imat.ihed] = matihed.ihed.id
-        newmatdata.iloc[:,imat.note] = 'IM Tool IHED Fit and Add'
+        cols = newmatdata.columns
+        row = newmatdata.iloc[0].to_dict() # blank template values; filled in below and made into one DataFrame row
+        row[cols[imat.name]] = matihed.name
+        row[cols[imat.rho0]] = matihed.rho0
+        row[cols[imat.c0]] = matihed.c0
+        row[cols[imat.s1]] = matihed.s1
+        row[cols[imat.s2]] = matihed.s2
+        row[cols[imat.d]] = matihed.d
+        row[cols[imat.g0]] = matihed.g0
+        row[cols[imat.q]] = matihed.q
+        row[cols[imat.uplow]] = matihed.uplow
+        row[cols[imat.uphigh]] = matihed.uphigh
+        row[cols[imat.ihed]] = matihed.ihed.id
+        row[cols[imat.note]] = 'IM Tool IHED Fit and Add'
         dt = datetime.now()        
-        newmatdata.iloc[:,imat.date] = dt.strftime('%Y-%m-%d')
-        matdata = pd.concat([newmatdata,matdata],ignore_index=True)
-        # update all the material listings
-        wdf_widget.value = matdata
-        ab_materials = list(matdata.loc[:,'Material'].values)
-        ab_materials.insert(0, 'Choose material')   # empty material at the top of the list
-        wmat1.options=ab_materials
-        wmat2.options=ab_materials
-        bc_materials = list(matdata.loc[:,'Material'].values)
-        bc_materials.insert(0, 'Choose material/nomaterial')   # empty material at the top of the list
-        wmat3.options=bc_materials
-        wmat4.options=bc_materials
-        all_materials = list(matdata.loc[:,'Material'].values)
-        wmat_drop.options=all_materials
-        wmat_ihed.options=all_materials
+        row[cols[imat.date]] = dt.strftime('%Y-%m-%d')
+        matdata = pd.concat([pd.DataFrame([row],columns=cols),matdata],ignore_index=True)
+        update_material_lists()
     
     waddihedbutton = pn.widgets.Button(name='Add IHED Fit to Material Database', button_type='primary')
     waddihedbutton.on_click(on_addihedbutton_clicked)
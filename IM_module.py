@@ -10,6 +10,7 @@ from pandas import DataFrame
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
 import os
+import math
 #
 __version__ = '1.2.2' # November 21, 2022 Fixed release state E and V for im2 points
 #__version__ = '1.2.1' # November 21, 2022 Fixed MakeMGIsentrope and PlotCurves
@@ -27,6 +28,14 @@ def UniversalHugoniot(up,a,b,c,d):
         Us = (a + b * up - c * up *np.exp(-d*up))
     """
     return (a + b * up - c * up *np.exp(-d*up)) # shock vel in m/s
+
+def UniversalHugoniotJacobian(up,a,b,c,d):
+    """ Function returns the partial derivatives of the modified universal liquid Hugoniot
+        with respect to a, b, c, d (one column each) for scipy curve_fit.
+        Usage: UniversalHugoniotJacobian(up,a,b,c,d):
+    """
+    upexp = up*np.exp(-d*up)
+    return np.column_stack((np.ones_like(up),up,-upexp,c*up*upexp))
     
 class MaterialIndices:
     """Class for book-keeping the column indices in the material database file."""
@@ -57,10 +66,14 @@ class EOS_Line:
         self.earr = 0. # specific energy J/kg
         self.uparr = 0. # particle velocity m/s
         self.uparr2 = 0. # particle velocity m/s FOR DEBUGGING
+        self.uprefl = 0. # particle velocity reflected about the start state m/s (release isentrope in the lab frame)
         self.usarr = 0. # shock velocity m/s
         self.tarr = 0. # temperature K
         self.sarr = 0. # specific entropy J/K/kg
         self.garr = 0. # Mie Grueneisen parameter [-]
+        self.table = 0. # principal Hugoniot only: usarr, parr, varr, earr, garr as rows of one array
+        self.uparr_kms = 0. # principal Hugoniot only: particle velocity km/s for plotting
+        self.parr_gpa = 0. # principal Hugoniot only: pressure GPa for plotting
 class EOS_Point:
     """Class for EOS point."""
     def __init__(self):
@@ -89,6 +102,9 @@ class IHED:
         self.earr     = 0.
         self.varr     = 0.
         self.marr     = 0. # ratio to full density
+        self.plotind  = np.array([],dtype=int) # indices of nonporous data points for plotting
+        self.upplot   = np.array([]) # nonporous data particle velocity km/s for plotting
+        self.pplot    = np.array([]) # nonporous data pressure GPa for plotting
         self.c0       = 0.
         self.s1       = 0.
         self.s2       = 0.
@@ -105,6 +121,8 @@ class Material:
         self.c0   = 0. # linear eos intercept m/s
         self.s1   = 0. # linear eos slope
         self.s2   = 0. # quadratic eos slope
+        self.d    = 0. # universal liquid Hugoniot exponent
+        self.hugform = 1 # Hugoniot form: 1 linear, 2 quadratic, 3 universal liquid (same as formflag in GetIHED)
         self.g0   = 0. # Mie Grueneisen parameter [-]
         self.q    = 0. # Mie Grueneisen parameter exponent [-] g0/v0=(g/v)^q
         self.p0   = 0. # initial pressure [Pa]
@@ -115,6 +133,10 @@ class Material:
         self.im2     = EOS_Point() # impedance match state 2 
         self.isen    = EOS_Line() # Release isentrope
         self.reshock = EOS_Line() # Reshock Hugoniot
+        self.isenkey    = None # start state and options of the current isentrope; reused by IM_match while unchanged
+        self.isensuccess = False
+        self.reshockkey = None # start state and options of the current reshock Hugoniot
+        self.reshocksuccess = False
         self.ihed    = IHED() # structure to store IHED data for this material
         self.ihed2   = IHED() # structure to store a second group of IHED or user data for this material
     def DefineParams(self,name,rho0,c0,s1,s2,d,g0,q,ihednum,note):
@@ -132,12 +154,28 @@ class Material:
         self.q    = q # [-]        
         self.ihed.id  = int(ihednum) # [integer] -1 indicates no data in IHED
         self.note  = note # string with user comment on sources for parameters
-    def DefineParamsID(self,matdatstr,matdata,imat):
+        self.SetHugoniotForm()
+    def SetHugoniotForm(self):
+        """ Set the Hugoniot form flag from the non-zero material parameters.
+            Usage: SetHugoniotForm(self):
+            Call again if s2 or d are changed directly.
+        """
+        if self.d != 0:
+            self.hugform = 3 # universal liquid Hugoniot
+        elif self.s2 != 0:
+            self.hugform = 2 # quadratic
+        else:
+            self.hugform = 1 # linear
+    def DefineParamsID(self,matdatstr,matdata,imat,idx=None):
         """ Initialize material parameters from using values from material database file.
-            Usage: DefineParamsID(self,matdatstr,matdata,imat):
+            Usage: DefineParamsID(self,matdatstr,matdata,imat,idx=None):
             Inputs: material name string, matdata DataFrame, matdata index structure
+                    Optional row number of the material in matdata (see MaterialNameIndex) to skip the name search.
         """
-        idx = np.where(matdata.loc[:,'Material'].values == matdatstr)[0]
+        if idx is None:
+            idx = np.where(matdata.loc[:,'Material'].values == matdatstr)[0]
+        else:
+            idx = [idx]
         #print(idx,matdatstr)
         if len(idx) > 0:
             #print('Material index=',idx,matdatstr)
@@ -152,6 +190,7 @@ class Material:
             self.q        = matdata.iloc[idx[0],imat.q] # [-]        
             self.ihed.id  = int(matdata.iloc[idx[0],imat.ihed]) # [integer] -1 indicates no data in IHED
             self.note     = matdata.iloc[idx[0],imat.note] # string with parameter source information
+            self.SetHugoniotForm()
         else:
             print('WARNING: Cannot find this material in the database: ',matdatstr)
     def GetIHED(self,formflag=1,upmin=0.,upmax=1E99,id2=-1,moredata=[-1],uselocalbool=False):
@@ -176,73 +215,8 @@ class Material:
             print('Hugoniot forms can only be line (1) or quadratic (2) or universal Hugoniot (3).')
             return
         if self.ihed.id > -1:
-            if uselocalbool: # check if local copy of IHED data exists; if not load it
-                ihedfname = 'database-ihed/IHED-'+str(self.ihed.id)+'.txt'
-                if not os.path.isdir('database-ihed/'):
-                    os.mkdir('database-ihed')
-                    print('made local directory: database-ihed')
-                if not os.path.exists(ihedfname):
-                    print('fetching IHED table from web server')
-                    url = 'http://www.ihed.ras.ru/rusbank/plaintext.php?substid='+str(self.ihed.id)+'&type=0'
-                    hds = {'user-agent':'Mozilla/5.0'}
-                    request = urllib.request.Request(url,headers=hds)
-                    response = urllib.request.urlopen(request).read()
-                    li=str(response).split("\\n")
-                    #print(li)
-                    with open(ihedfname, 'w') as fp:
-                        # save a local copy of the IHED data file
-                        print('writing local copy of IHED table')
-                        # a little cleanup
-                        tmp = str(response) # converts each newline into characters \n
-                        tmp = tmp[2::] # get rid of extra b'
-                        clean_response = tmp[0:len(tmp)-1] # get rid of ending '
-                        # split by \n and then join with newlines
-                        fp.write('\n'.join(clean_response.split("\\n")))  
-                        tmp=''
-                        clean_response=''
-                else:
-                    # read in the local copy
-                    #print('reading in local copy of IHED table #',self.ihed.id)
-                    with open(ihedfname) as fp:
-                        li = fp.readlines() # this is a list for each line
-                        #print(li)
-                        #return # for debugging
-            else:
-                # read IHED data from web server
-                url = 'http://www.ihed.ras.ru/rusbank/plaintext.php?substid='+str(self.ihed.id)+'&type=0'
-                hds = {'user-agent':'Mozilla/5.0'}
-                request = urllib.request.Request(url,headers=hds)
-                response = urllib.request.urlopen(request).read()
-                li=str(response).split("\\n")
-                #print(li)
-                #return # for debugging
-            df={} # initialize variable for table data frame 
-            # IHED table should be split into lines in list variable li
-            value=[]
-            material=li[1] # second line has material name and initial density in g/cm3
-            materialname=material.split(",")[0] # extract name
-            for k in li:
-                if k==li[0] or k==li[1] or k==li[2] or k==li[3]:
-                    continue
-                y=k.split()
-                if y[0]=="References:":
-                    break # stop gathering data 
-                value.append(y)
-                df[material]= DataFrame(value)
-            for key in df: # some data have remarks, some don't
-                if df[key].shape[1]==9:
-                    df[key].columns=['m','Up','Us','Pressure','R/R0_ratio','Density','E-E0','Rem','Reference']
-                elif df[key].shape[1]==8:
-                    df[key].columns=['m','Up','Us','Pressure','R/R0_ratio','Density','E-E0','Reference']
-            dataset = []
-            for key in df:
-                x = np.array(df[key]['Up'].astype('float64'))
-                y = np.array(df[key]['Us'].astype('float64'))    
-                p = np.array(df[key]['Pressure'].astype('float64'))
-                d = np.array(df[key]['Density'].astype('float64'))    
-                m = np.array(df[key]['m'].astype('float64'))
-                densitytemp=key.split()
-                density=float(densitytemp[-2])
+            # fetch (or reuse) the parsed IHED table
+            materialname, key, density, x, y, p, d, m = ReadIHED(self.ihed.id,uselocalbool=uselocalbool)
             self.ihed.rho0    = density * 1000. # kg/m3
             self.ihed.uparr   = x * 1000. # m/s
             self.ihed.usarr   = y * 1000. # m/s
@@ -250,11 +224,15 @@ class Material:
             self.ihed.parr    = p * 1E9 # Pa
             self.ihed.marr    = m # [-]
             self.ihed.matname = materialname
-            #print('Got IHED data: ',materialname,self.ihed.id,key)
-            # fit the nonporous data
-            ind = np.where( (self.ihed.uparr > upmin) & (self.ihed.uparr < upmax) & (self.ihed.marr == 1.0))[0]
+            self.ihed.plotind = np.where(self.ihed.marr == 1.0)[0] # nonporous data
             if self.name == 'Ice':
-                ind = np.where( (self.ihed.uparr > upmin) & (self.ihed.uparr < upmax) & (self.ihed.marr == 1.093))[0]
+                self.ihed.plotind = np.where(self.ihed.marr == 1.093)[0] # IHED used liquid water density
+            self.ihed.upplot  = self.ihed.uparr[self.ihed.plotind]/1.e3 # km/s
+            self.ihed.pplot   = self.ihed.parr[self.ihed.plotind]/1.e9 # GPa
+            #print('Got IHED data: ',materialname,self.ihed.id,key)
+            # fit the nonporous data in the requested up range
+            upnp = self.ihed.uparr[self.ihed.plotind]
+            ind = self.ihed.plotind[(upnp > upmin) & (upnp < upmax)]
             if len(ind)>0:
                 if formflag in [1,2]:
                     # line or quadratic
@@ -262,7 +240,7 @@ class Material:
                 if formflag == 3:
                     # curve fit to universal liquid Hugoniot
                     p0=[min(self.ihed.usarr),1.2,2.,.3e-3]
-                    fitparams, con = curve_fit(UniversalHugoniot, self.ihed.uparr[ind], self.ihed.usarr[ind],p0=p0)
+                    fitparams, con = curve_fit(UniversalHugoniot, self.ihed.uparr[ind], self.ihed.usarr[ind],p0=p0,jac=UniversalHugoniotJacobian)
                     #print('p0=',p0)
                     #print('Curvefit=',fitparams,con)
             elif moredata[0] == -1:
@@ -287,72 +265,7 @@ class Material:
                     self.ihed.d  = fitparams[3] # (m/s)^-1              
             if id2>-1:
                 # get a second set of data from IHED
-                if uselocalbool: # check if local copy of IHED data exists; if not load it
-                    ihedfname = 'database-ihed/IHED-'+str(id2)+'.txt'
-                    if not os.path.isdir('database-ihed/'):
-                        os.mkdir('database-ihed')
-                        print('made local directory: database-ihed')
-                    if not os.path.exists(ihedfname):
-                        print('fetching IHED table from web server')
-                        url = 'http://www.ihed.ras.ru/rusbank/plaintext.php?substid='+str(id2)+'&type=0'
-                        hds = {'user-agent':'Mozilla/5.0'}
-                        request = urllib.request.Request(url,headers=hds)
-                        response = urllib.request.urlopen(request).read()
-                        li=str(response).split("\\n")
-                        #print(li)
-                        with open(ihedfname, 'w') as fp:
-                            # save a local copy of the IHED data file
-                            print('writing local copy of IHED table')
-                            # a little cleanup
-                            tmp = str(response) # converts each newline into characters \n
-                            tmp = tmp[2::] # get rid of extra b'
-                            clean_response = tmp[0:len(tmp)-1] # get rid of ending '
-                            # split by \n and then join with newlines
-                            fp.write('\n'.join(clean_response.split("\\n")))  
-                            tmp=''
-                            clean_response=''
-                    else:
-                        # read in the local copy
-                        #print('reading in local copy of IHED table #',id2)
-                        with open(ihedfname) as fp:
-                            li = fp.readlines() # this is a list for each line
-                            #print(li)
-                            #return # for debugging
-                else:
-                    # read IHED data from web server
-                    url = 'http://www.ihed.ras.ru/rusbank/plaintext.php?substid='+str(id2)+'&type=0'
-                    hds = {'user-agent':'Mozilla/5.0'}
-                    request = urllib.request.Request(url,headers=hds)
-                    response = urllib.request.urlopen(request).read()
-                    li=str(response).split("\\n")
-                    #print(li)
-                    #return # for debugging
-                df={}
-                value=[]
-                material=li[1] # first line has material name and initial density in g/cm3
-                materialname=material.split(",")[0] # extract name
-                for k in li:
-                    if k==li[0] or k==li[1] or k==li[2] or k==li[3]:
-                        continue
-                    y=k.split()
-                    if y[0]=="References:":
-                        break # stop gathering data 
-                    value.append(y)
-                    df[material]= DataFrame(value)
-                for key in df: # some data have remarks, some don't
-                    if df[key].shape[1]==9:
-                        df[key].columns=['m','Up','Us','Pressure','R/R0_ratio','Density','E-E0','Rem','Reference']
-                    elif df[key].shape[1]==8:
-                        df[key].columns=['m','Up','Us','Pressure','R/R0_ratio','Density','E-E0','Reference']
-                dataset = []
-                for key in df:
-                    x = np.array(df[key]['Up'].astype('float64'))
-                    y = np.array(df[key]['Us'].astype('float64'))    
-                    p = np.array(df[key]['Pressure'].astype('float64'))
-                    d = np.array(df[key]['Density'].astype('float64'))    
-                    m = np.array(df[key]['m'].astype('float64'))
-                    densitytemp=key.split()
-                    density=float(densitytemp[-2])
+                materialname, key, density, x, y, p, d, m = ReadIHED(id2,uselocalbool=uselocalbool)
                 self.ihed2.rho0    = density * 1000. # kg/m3
                 self.ihed2.uparr   = x * 1000. # m/s
                 self.ihed2.usarr   = y * 1000. # m/s
@@ -372,7 +285,7 @@ class Material:
                 if formflag == 3:
                     ## CHANGE TO CURVEFIT
                     p0=[min(fitus),1.2,2.,.3e-3]
-                    fitparams, con = curve_fit(UniversalHugoniot, fitup, fitus, p0=p0)
+                    fitparams, con = curve_fit(UniversalHugoniot, fitup, fitus, p0=p0,jac=UniversalHugoniotJacobian)
                     #print('p0=',p0)
                     #print('Curvefit=',fitparams,con)
                #print(fitparams)
@@ -417,7 +330,7 @@ class Material:
                     fitparams = np.polyfit(fitup,fitus,formflag) # mks
                 if formflag == 3:
                     p0=[min(fitus),1.2,2.,.3e-3]
-                    fitparams, con = curve_fit(UniversalHugoniot, fitup, fitus, p0=p0)
+                    fitparams, con = curve_fit(UniversalHugoniot, fitup, fitus, p0=p0,jac=UniversalHugoniotJacobian)
                     #print('p0=',p0)
                     #print('Curvefit=',fitparams,con)
                 #print(fitparams)
@@ -446,12 +359,12 @@ class Material:
         """
         fig = plt.figure() # initialize the figure object
         paramstring = 'r$_0$='+ClStr(self.rho0/1.e3)+' (g/cm$^3$), Us (km/s)='+ClStr(self.c0/1.e3)+'+'+ClStr(self.s1)+'up'
-        if self.s2 != 0 and self.d == 0: # s2 is s/m -> s/km
+        if self.hugform == 2: # quadratic; s2 is s/m -> s/km
             if self.s2<0:
                 paramstring += str(self.s2*1.e3)+'up$^2$'
             if self.s2>0:
                 paramstring += '+'+str(self.s2*1.e3)+'up$^2$'
-        if self.d != 0: # s2 is dimless and d is s/m -> s/km
+        if self.hugform == 3: # universal liquid; s2 is dimless and d is s/m -> s/km
             if self.s2<0:
                 paramstring += ClStr(self.s2)+'up exp(-'+str(self.d*1.e3)
             if self.s2>0:
@@ -478,9 +391,7 @@ class Material:
             s2=self.ihed2.s2
             d=self.ihed2.d
         else:
-            ind = np.where(self.ihed.marr == 1.0)[0] # don't plot porous data 
-            if self.name == 'Ice':
-                ind = np.where(self.ihed.marr == 1.093)[0] # for some reason IHED did not use ice's actual density
+            ind = self.ihed.plotind # don't plot porous data; for some reason IHED did not use ice's actual density
             up1=self.ihed.uparr[ind]
             us1=self.ihed.usarr[ind]
             c0=self.ihed.c0
@@ -511,8 +422,8 @@ class Material:
         print('N='+str(len(up))+'. Fit stdev (km/s)='+str(np.std(diff/1000.)))
         # plot main Hugoniot fit from the materials database csv file
         #uptmp = np.arange(max(up))
-        if self.d == 0:
-            if self.s2 ==0:
+        if self.hugform in [1,2]:
+            if self.hugform == 1:
                 labelstr = 'Primary Linear Hugoniot fit'
             else:
                 labelstr = 'Primary Quadratic Hugoniot fit'
@@ -559,20 +470,28 @@ class Material:
             s2=self.s2
             d =self.d
         self.hug.uparr = uparr # array in m/s
+        self.isenkey = None # isentrope and reshock are made from the Hugoniot
+        self.reshockkey = None
+        # one allocation for the Hugoniot arrays; usarr, parr, varr, earr, garr are its rows
+        self.hug.table = np.empty((5,len(uparr)))
+        self.hug.usarr, self.hug.parr, self.hug.varr, self.hug.earr, self.hug.garr = self.hug.table
         if d == 0:
             # line or quadratic
-            self.hug.usarr = c0+s1*self.hug.uparr+s2*self.hug.uparr*self.hug.uparr # m/s
+            np.add(c0+s1*self.hug.uparr,s2*self.hug.uparr*self.hug.uparr,out=self.hug.usarr) # m/s
         else:
             # universal liquid Hugoniot a=c0, b=s1, c=s2, d=d
-            self.hug.usarr = c0+s1*self.hug.uparr-s2*self.hug.uparr*np.exp(-d*self.hug.uparr) # m/s            
-        self.hug.parr  = self.rho0*self.hug.uparr*self.hug.usarr # Pa
-        self.hug.varr  = self.v0*(1-self.hug.uparr/self.hug.usarr) # m3/kg
-        self.hug.earr  = self.e0+0.5*self.hug.parr*(self.v0-self.hug.varr) # J/kg
+            np.subtract(c0+s1*self.hug.uparr,s2*self.hug.uparr*np.exp(-d*self.hug.uparr),out=self.hug.usarr) # m/s
+        np.multiply(self.rho0*self.hug.uparr,self.hug.usarr,out=self.hug.parr) # Pa
+        np.multiply(self.v0,(1-self.hug.uparr/self.hug.usarr),out=self.hug.varr) # m3/kg
+        np.add(self.e0,0.5*self.hug.parr*(self.v0-self.hug.varr),out=self.hug.earr) # J/kg
         if self.g0 <= 0.:
             print('Gamma value not set. Using defaults: g0=1, q=1')
             self.g0=1.
             self.q=1.
-        self.hug.garr  = self.g0*np.power((self.rho0*self.hug.varr),self.q) # [-]
+        np.multiply(self.g0,np.power((self.rho0*self.hug.varr),self.q),out=self.hug.garr) # [-]
+        # plotting units, made once with the Hugoniot
+        self.hug.uparr_kms = self.hug.uparr/1.e3 # km/s
+        self.hug.parr_gpa = self.hug.parr/1.e9 # GPa
     def MakeMGIsentrope(self,pstart,usemgmodelbool=False,impvel=0.):
         """ Calculate the isentrope from pstart on the principal Hugoniot.
             MakeMGIsentrope(self,pstart,usemgmodelbool=False,impvel=0.)
@@ -586,6 +505,7 @@ class Material:
         """
         MGIsuccess=False
         MGIdebug=False
+        self.isenkey = None # IM_match sets the key after a successful call
         #Must create Hugoniot first
         if len(self.hug.parr) <= 10:
             MGIsuccess=False
@@ -611,87 +531,25 @@ class Material:
             return MGIsuccess
         istart  = np.where(self.hug.parr > pstart.p)[0][0]  # ASSUMES THAT THE VOLUME ARRAY DECREASES WITH INCREASING INDEX; Pressure increases with increasing index
         #print('ISTART=',istart,' Pstart=',pstart.p)
-        self.isen.parr = np.zeros(len(self.hug.varr))
         self.isen.varr = np.copy(self.hug.varr)
-        self.isen.earr = np.zeros(len(self.hug.varr))
-        self.isen.uparr = np.zeros(len(self.hug.varr))
-        self.isen.uparr2 = np.zeros(len(self.hug.varr))
         self.isen.garr = np.copy(self.hug.garr)
-        # calc for volumes on release
+        # calc for volumes on release and greater volumes for plotting purposes
         if MGIdebug: print('istart,v,p,up,e=',istart,pstart.v,pstart.p/1.e9,pstart.up/1.e3,pstart.e)
         #with open('log.txt', 'a') as fp: # debugging
         #    fp.write('pstart='+str(pstart.p)+' = '+str(self.hug.parr[istart])+'\n')
         #    fp.write('vstart='+str(pstart.v)+' = '+str(self.hug.varr[istart])+'\n')
-        for i in range(istart-1,-1,-1):
-            if i == istart-1:
-                dv = (self.isen.varr[i]-pstart.v) # positive means expansion
-                if MGIdebug: print('istart down dv, pstart.up, hugP[istart], hugP[istart-1] = ',dv,pstart.up/1.e3,self.hug.parr[i]/1.e9,self.hug.parr[i-1]/1.e9)
-                # check for roundoff errors for symmetric impact
-                if MGIdebug: print('impvel, up/impvel', impvel, ((2*pstart.up/impvel)))
-#                if (dv <= 0) or ((abs(2*pstart.up/impvel)-1)<1.e-5): 
-                if ((abs(2*pstart.up/impvel)-1)<1.e-5): 
-                    # sometimes dv is a very tiny number; not catching positive tiny right now
-                    # up vs impvel check is because there are floating precision problems
-                    # case of symmetric impact messing up the math
-                    if MGIdebug: print('***symmetric i=',i)
-                    self.isen.parr[i] = np.copy(pstart.p)
-                    self.isen.earr[i] = np.copy(pstart.e)
-                    self.isen.uparr[i]= np.copy(pstart.up)
-                    self.isen.uparr2[i]= np.copy(pstart.up)
-                    #print('symm up = ',self.isen.uparr[i],self.isen.uparr2[i])
-                else:
-                    if MGIdebug: print('not symmetric',i,(self.isen.garr[i]/self.isen.varr[i])*(pstart.e-self.hug.earr[i]-0.5*pstart.p*dv))
-                    self.isen.parr[i] = (self.hug.parr[i]+(self.isen.garr[i]/self.isen.varr[i])*(pstart.e-self.hug.earr[i]-0.5*pstart.p*dv)) / (1.+0.5*dv*self.hug.garr[i]/self.hug.varr[i])
-                    self.isen.earr[i] = pstart.e-0.5*(pstart.p+self.isen.parr[i])*dv
-                    if (-(pstart.p-self.isen.parr[i])/(pstart.v-self.isen.varr[i])) > 0:
-                        # no sqrt of negative numbers
-                        self.isen.uparr[i]= pstart.up-(pstart.p-self.isen.parr[i])/np.sqrt(-(pstart.p-self.isen.parr[i])/(pstart.v-self.isen.varr[i]))
-                        self.isen.uparr2[i]= pstart.up-(pstart.p-self.isen.parr[i])/np.sqrt(-(pstart.p-self.isen.parr[i])/(pstart.v-self.isen.varr[i]))
-                        #print('what is up with up1, up2 = ',self.isen.uparr[i],self.isen.uparr2[i])
-                    #print('down: ',i,dv,self.isen.parr[i]/1.e9,self.hug.parr[i]/1.e9,self.isen.earr[i]/1.e6)
-            else: # not the first step on the release
-                dv = (self.isen.varr[i]-self.isen.varr[i+1]) # expanding positive
-                #if MGIdebug: print('down i+1: ',i+1,dv,self.isen.parr[i+1]/1.e9,self.isen.earr[i+1]/1.e6)
-                #print('istart down rest dv = ',dv)
-                self.isen.parr[i] = (self.hug.parr[i]+(self.isen.garr[i]/self.isen.varr[i])*(self.isen.earr[i+1]-self.hug.earr[i]-0.5*self.isen.parr[i+1]*dv)) / (1.+0.5*dv*self.isen.garr[i]/self.isen.varr[i])
-                self.isen.earr[i] = self.isen.earr[i+1]-(self.isen.parr[i+1]+self.isen.parr[i])*dv/2.
-                if (-(self.isen.parr[i+1]-self.isen.parr[i])/(self.isen.varr[i+1]-self.isen.varr[i])) > 0:
-                    # no sqrt of negative numbers
-                    # these two equations for Uparr are identical along an isentrope
-                    self.isen.uparr[i]= self.isen.uparr[i+1]-(self.isen.parr[i+1]-self.isen.parr[i])/np.sqrt(-(self.isen.parr[i+1]-self.isen.parr[i])/(self.isen.varr[i+1]-self.isen.varr[i]))
-                    self.isen.uparr2[i]= self.isen.uparr2[i+1]-np.sqrt(-(self.isen.parr[i+1]-self.isen.parr[i])*(self.isen.varr[i+1]-self.isen.varr[i]))
-                    #if MGIdebug: print('down side i, up1, up2, dv = ',i,self.isen.uparr[i],self.isen.uparr2[i],dv)
-                else:
-                    self.isen.uparr[i]= self.isen.uparr[i+1]
-                    self.isen.uparr2[i]= self.isen.uparr2[i+1]
-                    if MGIdebug: print('check negative i up1 up2 dv = ',i,self.isen.uparr[i],self.isen.uparr2[i],dv)
-                if MGIdebug: print('down: ',i,dv,self.isen.parr[i]/1.e9,self.hug.parr[i]/1.e9,self.isen.earr[i]/1.e6)
-            #print(i,dv,self.isen.parr[i]/1.e9,self.isen.uparr[i]/1.e3,self.isen.earr[i])
-        # calc for greater volumes for plotting purposes
-        for i in range(istart,len(self.hug.parr)):
-            dv = (self.isen.varr[i]-self.isen.varr[i-1]) # now negative going to greater compression
-            #print('istart up rest dv = ',i,dv)
-            self.isen.parr[i] = (self.hug.parr[i]+(self.isen.garr[i]/self.isen.varr[i])*(self.isen.earr[i-1]-self.hug.earr[i]-0.5*self.isen.parr[i-1]*dv)) / (1.+0.5*dv*self.isen.garr[i]/self.isen.varr[i])
-            self.isen.earr[i] = self.isen.earr[i-1]-0.5*(self.isen.parr[i-1]+self.isen.parr[i])*dv
-            if (-(self.isen.parr[i-1]-self.isen.parr[i])/(self.isen.varr[i-1]-self.isen.varr[i])) > 0:
-                # no sqrt of negative numbers
-                # these two equations for Uparr are identical along an isentrope
-                self.isen.uparr[i]= self.isen.uparr[i-1]-(self.isen.parr[i-1]-self.isen.parr[i])/np.sqrt(-(self.isen.parr[i-1]-self.isen.parr[i])/(self.isen.varr[i-1]-self.isen.varr[i]))
-                self.isen.uparr2[i]= self.isen.uparr2[i-1]+np.sqrt(-(self.isen.parr[i-1]-self.isen.parr[i])*(self.isen.varr[i-1]-self.isen.varr[i]))
-            else:
-                # MG model is failing at higher pressures; this happens all the time so don't call it a fail
-                # but instead fill the upper parts of the isentrope with NaNs
-                #print('up side negative sqrt nans i, up(i-1)=',i, self.isen.uparr[i-1])
-                self.isen.parr[i::] = np.nan
-                self.isen.earr[i::] = np.nan
-                self.isen.uparr[i::]= np.nan
-                self.isen.uparr2[i::]= np.nan
-                MIGsuccess = True
-                return MGIsuccess
-        if MGIdebug: print('up: ',i,dv,self.isen.parr[i]/1.e9,self.hug.parr[i]/1.e9,self.isen.earr[i]/1.e6)    
-        #print(i,dv,self.isen.parr[i]/1.e9,self.isen.uparr[i]/1.e3,self.isen.earr[i])
-        # made it here without crashing; hopefully the arrays are all OK
-        MGIsuccess=True
+        # the step by step recurrence runs on lists of python floats, much faster than indexing numpy arrays element by element
+        hugarrs = [self.hug.parr,self.hug.earr,self.isen.varr,self.isen.garr]
+        try:
+            isenarrs = _mg_isentrope_loop(istart,float(pstart.p),float(pstart.v),float(pstart.e),float(pstart.up),impvel,
+                                          *[arr.tolist() for arr in hugarrs],debug=MGIdebug)
+        except ZeroDivisionError:
+            # a zero volume step; repeat with numpy scalars, which give inf/nan like array math instead of raising
+            isenarrs = _mg_isentrope_loop(istart,pstart.p,pstart.v,pstart.e,pstart.up,impvel,
+                                          *[list(arr) for arr in hugarrs],debug=MGIdebug)
+        self.isen.parr, self.isen.earr, self.isen.uparr, self.isen.uparr2 = [np.array(arr,dtype=float) for arr in isenarrs[0:4]]
+        # if the MG model failed going to greater compression, the upper parts of the isentrope are NaNs
+        MGIsuccess = isenarrs[4]
         return MGIsuccess
     #------------------------------------------------------------------------------------------
     def MakeReshockHug(self,pstart,usemgmodelbool=False):
@@ -703,6 +561,7 @@ class Material:
             Returns: successful calculation boolean
         """
         MGRsuccess=False
+        self.reshockkey = None # IM_match sets the key after a successful call
         if not usemgmodelbool:
             self.reshock.parr = np.copy(self.hug.parr)
             self.reshock.varr = np.copy(self.hug.varr)
@@ -767,85 +626,96 @@ class Material:
                     Optional figure filename, default is 'EOS-plots-'+self.name+'-v'+__version__+'.pdf'
         """
         paramstring = 'r$_0$='+ClStr(self.rho0/1.e3)+' (g/cm$^3$), Us (km/s)='+ClStr(self.c0/1.e3)+'+'+ClStr(self.s1)+'up'
-        if self.s2 != 0 and self.d == 0: # s2 is s/m -> s/km
+        if self.hugform == 2: # quadratic; s2 is s/m -> s/km
             if self.s2<0:
                 paramstring += str(self.s2*1.e3)+'up$^2$'
             if self.s2>0:
                 paramstring += '+'+str(self.s2*1.e3)+'up$^2$'
-        if self.d != 0: # s2 is dimless and d is s/m -> s/km
+        if self.hugform == 3: # universal liquid; s2 is dimless and d is s/m -> s/km
             if self.s2<0:
                 paramstring += ClStr(self.s2)+'up exp(-'+str(self.d*1.e3)+'up)'
             if self.s2>0:
                 paramstring += '+'+ClStr(self.s2)+'up exp(-'+str(self.d*1.e3)+'up)'
             
-        plt.rcParams["figure.figsize"] = (12,10)
-        plt.rc('font', size=15)
         self.im1.p=pstart
-        self.im1.v=1/np.interp(pstart,self.hug.parr,1/self.hug.varr)
-        self.im1.e=np.interp(pstart,self.hug.parr,self.hug.earr)
+        # volume, energy and particle velocity at pstart, with one search of the Hugoniot pressures
+        self.im1.v, self.im1.e, up0 = _interp_point(pstart,self.hug.parr,[self.hug.varr,self.hug.earr,self.hug.uparr])
         MGIsuccess = self.MakeMGIsentrope(self.im1,usemgmodelbool=usegmodelbool,impvel=impvel)
         #print('MGI success flag = ',MGIsuccess)
         self.MakeReshockHug(self.im1,usemgmodelbool=usegmodelbool)
-        rhomax = np.interp(pstart*3,self.hug.parr,1/self.hug.varr)/1.e3
+        # density array (kg/m3) computed once; the isentrope and reshock Hugoniot use the same volume array as the Hugoniot
+        rhoarr = 1/self.hug.varr
+        rhomax = np.interp(pstart*3,self.hug.parr,rhoarr)/1.e3
         rhomin = 0.8*(self.rho0/1.e3)
         #print(rhomax)
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2,2)
-        st = fig.suptitle(r' '+self.name+'\n'+paramstring)
-        ax1.plot(1/self.hug.varr/1.e3,self.hug.parr/1.e9,label='Hugoniot')
-        if MGIsuccess: 
-            ax1.plot(1/self.isen.varr/1.e3,self.isen.parr/1.e9,label='Isentrope')
-        ax1.plot(1/self.reshock.varr/1.e3,self.reshock.parr/1.e9,'--',label='Reshock Hug.')
-        ax1.set_xlabel('Density (g/cm$^3$)')
-        ax1.set_ylabel('Pressure (GPa)')
-        ax1.set_ylim([0,pstart*3/1.e9])
-        ax1.set_xlim([rhomin,rhomax])
-        ax1.legend()
+        # larger figure and font for this figure only; the global rcParams are left unchanged
+        with plt.rc_context({'figure.figsize':(12,10),'font.size':15}):
+            fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2,2)
+            st = fig.suptitle(r' '+self.name+'\n'+paramstring)
+            ax1.plot(rhoarr/1.e3,self.hug.parr/1.e9,label='Hugoniot')
+            if MGIsuccess: 
+                ax1.plot(rhoarr/1.e3,self.isen.parr/1.e9,label='Isentrope')
+            ax1.plot(rhoarr/1.e3,self.reshock.parr/1.e9,'--',label='Reshock Hug.')
+            ax1.set_xlabel('Density (g/cm$^3$)')
+            ax1.set_ylabel('Pressure (GPa)')
+            ax1.set_ylim([0,pstart*3/1.e9])
+            ax1.set_xlim([rhomin,rhomax])
+            ax1.legend()
         
-        ind=np.where(self.hug.parr < 2*pstart)[0]
-        ax2.plot(1/self.hug.varr[ind]/1.e3,self.hug.earr[ind]/1.e6,label='Hugoniot')
-        if MGIsuccess: 
-            ax2.plot(1/self.isen.varr[ind]/1.e3,self.isen.earr[ind]/1.e6,label='Isentrope')
-        ax2.plot(1/self.reshock.varr[ind]/1.e3,self.reshock.earr[ind]/1.e6,'--',label='Reshock Hug.')
-        ax2.set_xlabel('Density (g/cm$^3$)')
-        ax2.set_xlim([rhomin,rhomax])
-        ax2.set_ylabel('Energy (MJ/kg)')
-        ax2.legend()
+            ind=np.where(self.hug.parr < 2*pstart)[0]
+            ax2.plot(rhoarr[ind]/1.e3,self.hug.earr[ind]/1.e6,label='Hugoniot')
+            if MGIsuccess: 
+                ax2.plot(rhoarr[ind]/1.e3,self.isen.earr[ind]/1.e6,label='Isentrope')
+            ax2.plot(rhoarr[ind]/1.e3,self.reshock.earr[ind]/1.e6,'--',label='Reshock Hug.')
+            ax2.set_xlabel('Density (g/cm$^3$)')
+            ax2.set_xlim([rhomin,rhomax])
+            ax2.set_ylabel('Energy (MJ/kg)')
+            ax2.legend()
 
-        ax3.plot(1/self.hug.varr/1.e3,self.hug.garr,label='$\gamma(v)$')
-        ax3.plot(1/self.hug.varr/1.e3,self.g0*self.hug.varr/self.v0,'--',label='$\gamma_0$/$v_0$=const')
-        ax3.set_xlabel('Density (g/cm$^3$)')
-        ax3.legend()
-        ax3.set_ylabel('Mie Grueneisen Parameter')
-        ax3.set_xlabel('Density (g/cm$^3$)')
-        ax3.set_xlim([rhomin,rhomax])
+            ax3.plot(rhoarr/1.e3,self.hug.garr,label='$\gamma(v)$')
+            ax3.plot(rhoarr/1.e3,self.g0*self.hug.varr/self.v0,'--',label='$\gamma_0$/$v_0$=const')
+            ax3.set_xlabel('Density (g/cm$^3$)')
+            ax3.legend()
+            ax3.set_ylabel('Mie Grueneisen Parameter')
+            ax3.set_xlabel('Density (g/cm$^3$)')
+            ax3.set_xlim([rhomin,rhomax])
 
-        ind=np.where(self.hug.parr < 3*pstart)[0]
-        up0 = np.interp(pstart,self.hug.parr,self.hug.uparr)
-        ax4.plot(self.hug.uparr/1.e3,self.hug.parr/1.e9,label='Hugoniot')
-        if MGIsuccess: 
+            ind=np.where(self.hug.parr < 3*pstart)[0]
+            ax4.plot(self.hug.uparr/1.e3,self.hug.parr/1.e9,label='Hugoniot')
+            if MGIsuccess: 
 #2*mat5.im1.up
-            #ax4.plot(up0/1.e3+self.isen.uparr/1.e3,self.isen.parr/1.e9,label='Isentrope')
-            ax4.plot(self.isen.uparr/1.e3,self.isen.parr/1.e9,label='Isentrope')
-        #ax4.plot(up0/1.e3+self.isen.uparr2/1.e3,self.isen.parr/1.e9,'--',label='isen2')
-        ax4.plot(self.reshock.uparr/1.e3,self.reshock.parr/1.e9,label='Reshock A')
-        ax4.plot(self.reshock.uparr2/1.e3,self.reshock.parr/1.e9,'--',label='Reshock B')
-        ax4.set_ylim([0,pstart*3/1.e9])
-        ax4.set_xlim([0,up0*2/1.e3])
-        ax4.legend()
-        ax4.set_xlabel('Particle Velocity (km/s)')
-        ax4.set_ylabel('Pressure (GPa)')
-        #print(impvel/1.e3,self.isen.uparr2/1.e3)
+                #ax4.plot(up0/1.e3+self.isen.uparr/1.e3,self.isen.parr/1.e9,label='Isentrope')
+                ax4.plot(self.isen.uparr/1.e3,self.isen.parr/1.e9,label='Isentrope')
+            #ax4.plot(up0/1.e3+self.isen.uparr2/1.e3,self.isen.parr/1.e9,'--',label='isen2')
+            ax4.plot(self.reshock.uparr/1.e3,self.reshock.parr/1.e9,label='Reshock A')
+            ax4.plot(self.reshock.uparr2/1.e3,self.reshock.parr/1.e9,'--',label='Reshock B')
+            ax4.set_ylim([0,pstart*3/1.e9])
+            ax4.set_xlim([0,up0*2/1.e3])
+            ax4.legend()
+            ax4.set_xlabel('Particle Velocity (km/s)')
+            ax4.set_ylabel('Pressure (GPa)')
+            #print(impvel/1.e3,self.isen.uparr2/1.e3)
 
-        fig.tight_layout()
-        if savebool:
-            # now an input variable: fname='EOS-plots-'+self.name+'-v'+__version__+'.pdf'
-            if fname == '':
-                fname='EOS-plots-'+self.name+'-v'+__version__+'.pdf'
-            fig.savefig(fname,dpi=300)
+            fig.tight_layout()
+            if savebool:
+                # now an input variable: fname='EOS-plots-'+self.name+'-v'+__version__+'.pdf'
+                if fname == '':
+                    fname='EOS-plots-'+self.name+'-v'+__version__+'.pdf'
+                fig.savefig(fname,dpi=300)
         #plt.show()
         #plt.close(fig)
         #return fig
     #------------------------------------------------------------------------------------------
+    def _make_release_isentrope(self,usemgmodelbool,vel):
+        # release isentrope from self.im1 and its up array reflected about the start state, for IM_match;
+        # the isentrope only depends on the start state and impact velocity; reuse it when only plot settings changed
+        isenkey = (self.im1.p,self.im1.v,self.im1.e,self.im1.up,usemgmodelbool,vel)
+        if isenkey != self.isenkey:
+            self.isensuccess = self.MakeMGIsentrope(self.im1,usemgmodelbool=usemgmodelbool,impvel=vel)
+            self.isen.uprefl = 2*self.im1.up-self.isen.uparr # computed once for the crossing, the interpolation and the plot
+            self.isenkey = isenkey
+        return self.isensuccess
+    #------------------------------------------------------------------------------------------
     def IM_match(self,matb,vel=0.,pstart=0,usemgmodelbool=False):
         """ Plot principal Hugoniot and isentropes and reshock Hugoniot from pstart.
             Usage: PlotCurves(self,pstart,savebool=False,fname=''):
@@ -858,16 +728,14 @@ class Material:
         if (pstart==0) and (vel>0):
             # This is the first pair of materials: mata -> matb at vel (mks)
             # find index and initialize Hugoniot for each material layer
-            res = Intersection(matb.hug.uparr,matb.hug.parr,vel-self.hug.uparr,self.hug.parr)
+            res = IntersectMonotonic(matb.hug.uparr,matb.hug.parr,vel-self.hug.uparr,self.hug.parr) # both Hugoniots are single-valued in up
             print('1st IM: ',vel,res[0],res[1]/1.e9)
             self.im1.up=res[0][0] # m/s
             self.im1.p=res[1][0] # Pa
-            self.im1.v=1./(np.interp(res[0],self.hug.uparr,1./self.hug.varr)[0]) # assumes f is monotonic and increasing
-            self.im1.e=np.interp(res[0],self.hug.uparr,self.hug.earr)[0] # assumes f is monotonic and increasing
+            self.im1.v, self.im1.e = _interp_point(res[0][0],self.hug.uparr,[self.hug.varr,self.hug.earr]) # assumes f is monotonic and increasing
             matb.im1.up=res[0][0]
             matb.im1.p=res[1][0]
-            matb.im1.v=1./(np.interp(res[0],matb.hug.uparr,1./matb.hug.varr)[0]) # assumes f is monotonic and increasing
-            matb.im1.e=np.interp(res[0],matb.hug.uparr,matb.hug.earr)[0] # assumes f is monotonic and increasing
+            matb.im1.v, matb.im1.e = _interp_point(res[0][0],matb.hug.uparr,[matb.hug.varr,matb.hug.earr]) # assumes f is monotonic and increasing
             IM_match_success = True
             return IM_match_success
         
@@ -876,12 +744,33 @@ class Material:
            # This is a target pair of materials mata.im1 release/reshock into matb initially at rest & 0 pressure
             matbhug_patup = np.interp(self.im1.up,matb.hug.uparr,matb.hug.parr) # monotonic increasing density
             print('matbhug_patup (GPa) = ',matbhug_patup/1.e9)
+            if abs(matbhug_patup-self.im1.p) <= 1.e-9*abs(self.im1.p):
+                # equal impedance (e.g., same material in consecutive layers): the wave passes through with the same p and up
+                # the release isentrope is still made, so the plot shows the mata curve through the matched state
+                isen_success = self._make_release_isentrope(usemgmodelbool,vel)
+                print('ISEN SUCCESS = ',isen_success)
+                self.im2.up=self.im1.up # m/s
+                self.im2.p=self.im1.p # Pa
+                self.im2.v=self.im1.v
+                self.im2.e=self.im1.e
+                matb.im1.up=self.im1.up
+                matb.im1.p=self.im1.p
+                matb.im1.v, matb.im1.e = _interp_point(self.im1.up,matb.hug.uparr,[matb.hug.varr,matb.hug.earr]) # assumes f is monotonic and increasing
+                IM_match_success = True
+                return IM_match_success
             if matbhug_patup > self.im1.p:
                 # reshock mata into matb
-                reshock_success = self.MakeReshockHug(self.im1,usemgmodelbool=usemgmodelbool)
+                # the reshock Hugoniot only depends on the start state; reuse it when only plot settings changed
+                reshockkey = (self.im1.p,self.im1.v,self.im1.e,self.im1.up,usemgmodelbool)
+                if reshockkey != self.reshockkey:
+                    self.reshocksuccess = self.MakeReshockHug(self.im1,usemgmodelbool=usemgmodelbool)
+                    self.reshockkey = reshockkey
+                reshock_success = self.reshocksuccess
                 print('RESHOCK SUCCESS = ',reshock_success)
                 #self.reshock.uparr is decreasing
-                res_reshock = Intersection(matb.hug.uparr,matb.hug.parr,np.flip(self.reshock.uparr),np.flip(self.reshock.parr))
+                # reshock up array is decreasing; flip it once for the crossing and both interpolations
+                reshockup = np.ascontiguousarray(np.flip(self.reshock.uparr))
+                res_reshock = IntersectionLocal(matb.hug.uparr,matb.hug.parr,reshockup,np.flip(self.reshock.parr),self.im1.up,window=1.) # crossing is between 0 and 2*im1.up
                 #plt.plot(matb.hug.uparr,matb.hug.parr)
                 #plt.plot(self.reshock.uparr,self.reshock.parr))
                 print('res_reshock = ',res_reshock[0],res_reshock[1]/1.e9,len(res_reshock))
@@ -892,12 +781,10 @@ class Material:
                     self.im2.up=res_reshock[0][0] # m/s
                     self.im2.p=res_reshock[1][0] # Pa
                     # reshock up array is decreasing, so flip
-                    self.im2.v=1./(np.interp(res_reshock[0],np.flip(self.reshock.uparr),1./np.flip(self.reshock.varr))[0]) # assumes f is monotonic and increasing
-                    self.im2.e=np.interp(res_reshock[0],np.flip(self.reshock.uparr),np.flip(self.reshock.earr))[0] # assumes f is monotonic and increasing
+                    self.im2.v, self.im2.e = _interp_point(res_reshock[0][0],reshockup,[np.flip(self.reshock.varr),np.flip(self.reshock.earr)]) # assumes f is monotonic and increasing
                     matb.im1.up=res_reshock[0][0]
                     matb.im1.p=res_reshock[1][0]
-                    matb.im1.v=1./(np.interp(res_reshock[0],matb.hug.uparr,1./matb.hug.varr)[0]) # assumes f is monotonic and increasing
-                    matb.im1.e=np.interp(res_reshock[0],matb.hug.uparr,matb.hug.earr)[0] # assumes f is monotonic and increasing
+                    matb.im1.v, matb.im1.e = _interp_point(res_reshock[0][0],matb.hug.uparr,[matb.hug.varr,matb.hug.earr]) # assumes f is monotonic and increasing
                     IM_match_success = True
                     return IM_match_success
                 else:
@@ -917,11 +804,10 @@ class Material:
                     return IM_match_success
             else:
                 # release mata into matb
-                isen_success = self.MakeMGIsentrope(self.im1,usemgmodelbool=usemgmodelbool,impvel=vel)
+                isen_success = self._make_release_isentrope(usemgmodelbool,vel)
                 print('ISEN SUCCESS = ',isen_success)
                 # find intersection between mata isentrope and matb Hugoniot
-                ind = np.where((self.isen.parr > 0))[0]
-                res_release = Intersection(matb.hug.uparr,matb.hug.parr,(2*self.im1.up-self.isen.uparr),self.isen.parr)
+                res_release = IntersectionLocal(matb.hug.uparr,matb.hug.parr,self.isen.uprefl,self.isen.parr,self.im1.up,window=1.) # crossing is between 0 and 2*im1.up
                 print('res_release = ',res_release,len(res_release))
                 if len(res_release[0])>0:
                     #with open('log.txt', 'a') as fp: # debugging
@@ -930,12 +816,15 @@ class Material:
                     self.im2.up=res_release[0][0] # m/s
                     self.im2.p=res_release[1][0] # Pa
                     ind = np.where(self.isen.varr > 0)[0]
-                    self.im2.v=1./(np.interp(res_release[0],np.flip(2*self.im1.up-self.isen.uparr[ind]),np.flip(1./self.isen.varr[ind]))[0]) # assumes f is monotonic and increasing
-                    self.im2.e=np.interp(res_release[0],np.flip(2*self.im1.up-self.isen.uparr),np.flip(self.isen.earr))[0] # assumes f is monotonic and increasing
+                    if len(ind) == len(self.isen.varr):
+                        # volume and energy on the same grid: one search for both
+                        self.im2.v, self.im2.e = _interp_point(res_release[0][0],np.flip(self.isen.uprefl),[np.flip(self.isen.varr),np.flip(self.isen.earr)]) # assumes f is monotonic and increasing
+                    else:
+                        self.im2.v=np.interp(res_release[0][0],np.flip(self.isen.uprefl[ind]),np.flip(self.isen.varr[ind])) # assumes f is monotonic and increasing
+                        self.im2.e=np.interp(res_release[0][0],np.flip(self.isen.uprefl),np.flip(self.isen.earr)) # assumes f is monotonic and increasing
                     matb.im1.up=res_release[0][0]
                     matb.im1.p=res_release[1][0]
-                    matb.im1.v=1./(np.interp(res_release[0],matb.hug.uparr,1./matb.hug.varr)[0]) # assumes f is monotonic and increasing
-                    matb.im1.e=np.interp(res_release[0],matb.hug.uparr,matb.hug.earr)[0] # assumes f is monotonic and increasing
+                    matb.im1.v, matb.im1.e = _interp_point(res_release[0][0],matb.hug.uparr,[matb.hug.varr,matb.hug.earr]) # assumes f is monotonic and increasing
                     IM_match_success = True
                     return IM_match_success
                 else:
@@ -956,6 +845,80 @@ class Material:
                         
 #------------------------------------------------------------------------------------------
 #------------------------------------------------------------------------------------------        
+def MakeHugoniotBatch(mats,uparr,ihedbool=False):
+    """ Make the principal Hugoniots of several materials on the same particle velocity array.
+        Usage: MakeHugoniotBatch(mats,uparr,ihedbool=False)
+        Inputs: list of Material objects with parameters defined (DefineParams or DefineParamsID); particle velocity numpy array in m/s.
+        Optional ihedbool boolean, as in Material.MakeHugoniot.
+        Calls mat.MakeHugoniot(uparr) for each material, so the Hugoniot equations live in one place.
+    """
+    for mat in mats:
+        mat.MakeHugoniot(uparr,ihedbool=ihedbool)
+def _mg_isentrope_loop(istart,pp,pv,pe,pup,impvel,hp,he,v,g,debug=False):
+    # Mie-Grueneisen isentrope recurrence for Material.MakeMGIsentrope, starting between hug indices istart-1 and istart
+    # pp,pv,pe,pup: start state P, V, E, up; hp,he,v,g: Hugoniot P, E, volume and gamma as lists
+    # returns lists p,e,up,up2 and False if the MG model failed going to greater compression (NaNs from there on)
+    n = len(v)
+    p = [0.]*n
+    e = [0.]*n
+    up = [0.]*n
+    up2 = [0.]*n
+    nan = float('nan')
+    # calc for volumes on release
+    for i in range(istart-1,-1,-1):
+        if i == istart-1:
+            dv = (v[i]-pv) # positive means expansion
+            # check for roundoff errors for symmetric impact
+            if ((abs(2*pup/impvel)-1)<1.e-5):
+                # up vs impvel check is because there are floating precision problems
+                # case of symmetric impact messing up the math
+                if debug: print('***symmetric i=',i)
+                p[i] = pp
+                e[i] = pe
+                up[i] = pup
+                up2[i] = pup
+            else:
+                p[i] = (hp[i]+(g[i]/v[i])*(pe-he[i]-0.5*pp*dv)) / (1.+0.5*dv*g[i]/v[i])
+                e[i] = pe-0.5*(pp+p[i])*dv
+                if (-(pp-p[i])/(pv-v[i])) > 0:
+                    # no sqrt of negative numbers
+                    up[i] = pup-(pp-p[i])/math.sqrt(-(pp-p[i])/(pv-v[i]))
+                    up2[i] = up[i]
+        else: # not the first step on the release
+            dv = (v[i]-v[i+1]) # expanding positive
+            p[i] = (hp[i]+(g[i]/v[i])*(e[i+1]-he[i]-0.5*p[i+1]*dv)) / (1.+0.5*dv*g[i]/v[i])
+            e[i] = e[i+1]-(p[i+1]+p[i])*dv/2.
+            if (-(p[i+1]-p[i])/(v[i+1]-v[i])) > 0:
+                # no sqrt of negative numbers
+                # these two equations for up are identical along an isentrope
+                up[i] = up[i+1]-(p[i+1]-p[i])/math.sqrt(-(p[i+1]-p[i])/(v[i+1]-v[i]))
+                up2[i] = up2[i+1]-math.sqrt(-(p[i+1]-p[i])*(v[i+1]-v[i]))
+            else:
+                up[i] = up[i+1]
+                up2[i] = up2[i+1]
+                if debug: print('check negative i up1 up2 dv = ',i,up[i],up2[i],dv)
+    # calc for greater volumes for plotting purposes
+    for i in range(istart,n):
+        dv = (v[i]-v[i-1]) # now negative going to greater compression
+        p[i] = (hp[i]+(g[i]/v[i])*(e[i-1]-he[i]-0.5*p[i-1]*dv)) / (1.+0.5*dv*g[i]/v[i])
+        e[i] = e[i-1]-0.5*(p[i-1]+p[i])*dv
+        if (-(p[i-1]-p[i])/(v[i-1]-v[i])) > 0:
+            # no sqrt of negative numbers
+            up[i] = up[i-1]-(p[i-1]-p[i])/math.sqrt(-(p[i-1]-p[i])/(v[i-1]-v[i]))
+            up2[i] = up2[i-1]+math.sqrt(-(p[i-1]-p[i])*(v[i-1]-v[i]))
+        else:
+            # MG model is failing at higher pressures; fill the upper parts of the isentrope with NaNs
+            p[i:] = [nan]*(n-i)
+            e[i:] = [nan]*(n-i)
+            up[i:] = [nan]*(n-i)
+            up2[i:] = [nan]*(n-i)
+            return p, e, up, up2, False
+    return p, e, up, up2, True
+def _interp_point(x,xp,fparrs):
+    # np.interp of several arrays on the same increasing grid xp at one point x, with one search of xp
+    j = min(max(np.searchsorted(xp,x,side='right')-1,0),len(xp)-2)
+    f = min(max((x-xp[j])/(xp[j+1]-xp[j]),0.),1.) # clamp to the end values like np.interp
+    return [fp[j]+f*(fp[j+1]-fp[j]) for fp in fparrs]
 def ClStr(value):
     """ Return string with value rounded to 2 decimal places.
         Usage: ClStr(value): 
@@ -966,12 +929,19 @@ def ClStr(value):
     else:
         return(str(round(value*100)/100.))
 
+materialscache = {} # converted materials tables keyed by (file name, modification time); each file version is read once per session
+
 def ReadMaterials(matfilename='materials-data.csv'):
-    """Reads in materials data CSV file and converts to mks. 
+    """Reads in materials data CSV file and converts to mks; converted tables are kept in materialscache.
        Usage: matdata, imat = ReadMaterials(matfilename='materials-data.csv')
        Output: 2 objects: DataFrame and DF index structure.
        To view the output: display(matdata) and vars(imat)
+       Returns a new copy of the DataFrame each call, so callers may edit it.
     """
+    cachekey = (matfilename, os.path.getmtime(matfilename)) # an edited file is read again
+    if cachekey in materialscache:
+        matdata, imat = materialscache[cachekey]
+        return matdata.copy(), imat
     #print('Reading materials data file and converting to mks: ',matfilename)
     matdata=pd.read_csv(matfilename) 
 
@@ -1019,12 +989,104 @@ def ReadMaterials(matfilename='materials-data.csv'):
     # convert date column to string
     matdata['Date'] = matdata['Date'].astype(str)
     matdata['Notes'] = matdata['Notes'].astype(str)
-    return matdata, imat # DataFrame of csv file and MaterialIndices object that defines the columns of the DF
+    materialscache[cachekey] = (matdata, imat)
+    return matdata.copy(), imat # DataFrame of csv file and MaterialIndices object that defines the columns of the DF
+
+ihedcache = {} # parsed IHED tables keyed by IHED material ID number; each table is fetched and parsed once per session
+
+def ReadIHED(ihedid,uselocalbool=False):
+    """ Fetches and parses one IHED shock wave data table; parsed tables are kept in ihedcache.
+        Usage: materialname, key, density, up, us, p, rho, m = ReadIHED(ihedid,uselocalbool=False)
+        Inputs: IHED material ID number. 
+                Optional uselocalbool boolean flag to read and save IHED data in local directory.
+        Output: material name, table header line, initial density (g/cm3) and data arrays in IHED units 
+                (km/s, km/s, GPa, g/cm3, ratio to full density).
+    """
+    if ihedid in ihedcache:
+        return ihedcache[ihedid]
+    if uselocalbool: # check if local copy of IHED data exists; if not load it
+        ihedfname = 'database-ihed/IHED-'+str(ihedid)+'.txt'
+        if not os.path.isdir('database-ihed/'):
+            os.makedirs('database-ihed',exist_ok=True) # tables may be fetched from several threads
+            print('made local directory: database-ihed')
+        if not os.path.exists(ihedfname):
+            print('fetching IHED table from web server')
+            url = 'http://www.ihed.ras.ru/rusbank/plaintext.php?substid='+str(ihedid)+'&type=0'
+            hds = {'user-agent':'Mozilla/5.0'}
+            request = urllib.request.Request(url,headers=hds)
+            response = urllib.request.urlopen(request).read()
+            li=str(response).split("\\n")
+            #print(li)
+            with open(ihedfname, 'w') as fp:
+                # save a local copy of the IHED data file
+                print('writing local copy of IHED table')
+                # a little cleanup
+                tmp = str(response) # converts each newline into characters \n
+                tmp = tmp[2::] # get rid of extra b'
+                clean_response = tmp[0:len(tmp)-1] # get rid of ending '
+                # split by \n and then join with newlines
+                fp.write('\n'.join(clean_response.split("\\n")))  
+                tmp=''
+                clean_response=''
+        else:
+            # read in the local copy
+            #print('reading in local copy of IHED table #',ihedid)
+            with open(ihedfname) as fp:
+                li = fp.readlines() # this is a list for each line
+    else:
+        # read IHED data from web server
+        url = 'http://www.ihed.ras.ru/rusbank/plaintext.php?substid='+str(ihedid)+'&type=0'
+        hds = {'user-agent':'Mozilla/5.0'}
+        request = urllib.request.Request(url,headers=hds)
+        response = urllib.request.urlopen(request).read()
+        li=str(response).split("\\n")
+        #print(li)
+    df={} # initialize variable for table data frame 
+    # IHED table should be split into lines in list variable li
+    value=[]
+    material=li[1] # second line has material name and initial density in g/cm3
+    materialname=material.split(",")[0] # extract name
+    for k in li:
+        if k==li[0] or k==li[1] or k==li[2] or k==li[3]:
+            continue
+        y=k.split()
+        if y[0]=="References:":
+            break # stop gathering data 
+        value.append(y)
+        df[material]= DataFrame(value)
+    for key in df: # some data have remarks, some don't
+        if df[key].shape[1]==9:
+            df[key].columns=['m','Up','Us','Pressure','R/R0_ratio','Density','E-E0','Rem','Reference']
+        elif df[key].shape[1]==8:
+            df[key].columns=['m','Up','Us','Pressure','R/R0_ratio','Density','E-E0','Reference']
+    for key in df:
+        x = np.array(df[key]['Up'].astype('float64'))
+        y = np.array(df[key]['Us'].astype('float64'))    
+        p = np.array(df[key]['Pressure'].astype('float64'))
+        d = np.array(df[key]['Density'].astype('float64'))    
+        m = np.array(df[key]['m'].astype('float64'))
+        densitytemp=key.split()
+        density=float(densitytemp[-2])
+    for arr in (x,y,p,d,m):
+        arr.flags.writeable = False # shared by every material that uses this table
+    ihedcache[ihedid] = (materialname, key, density, x, y, p, d, m)
+    return ihedcache[ihedid]
+
+def MaterialNameIndex(matdata):
+    """ Returns dictionary of material name -> row number in the matdata DataFrame.
+        Usage: mat_index = MaterialNameIndex(matdata)
+        Rebuild whenever materials are added or removed from matdata.
+        If a name appears more than once, the first row is used (same as DefineParamsID).
+    """
+    mat_index = {}
+    for i, name in enumerate(matdata.loc[:,'Material'].values):
+        mat_index.setdefault(name,i)
+    return mat_index
 
 def FitUsUp(uparr,usarr,formflag=1,upmin=0.,upmax=1.e99):
     """ Fits particle velocity-shock velocity data with a Hugoniot form.
         Usage: fitparams = FitUsUp(uparr,usarr,formflag=1,upmin=0.,upmax=1.e99)
-        Dependencies: UniversalHugoniot function for scipy curve_fit.
+        Dependencies: UniversalHugoniot and UniversalHugoniotJacobian functions for scipy curve_fit.
         Inputs: particle velocity numpy array, shock velocity numpy array
         Optional: formflag = 1 (default), 2, 3
          1 is line Us = c0 + s1 * up
@@ -1064,7 +1126,8 @@ def FitUsUp(uparr,usarr,formflag=1,upmin=0.,upmax=1.e99):
     if formflag == 3:
         # curve fit to universal liquid Hugoniot
         p0=[min(usarr),1.2,2.,.3e-3] # curve_fit needs an initial guess to converge 
-        fitparams, con = curve_fit(UniversalHugoniot, uparr[ind], usarr[ind],p0=p0)
+        # the analytic Jacobian replaces the finite difference derivatives (fewer function calls per iteration)
+        fitparams, con = curve_fit(UniversalHugoniot, uparr[ind], usarr[ind],p0=p0,jac=UniversalHugoniotJacobian)
     return fitparams
 
 #==================================================================================================
@@ -1076,16 +1139,16 @@ def FitUsUp(uparr,usarr,formflag=1,upmin=0.,upmax=1.e99):
 #5 April 2017
 #Based on: http://uk.mathworks.com/matlabcentral/fileexchange/11837-fast-and-robust-curve-intersections
 #"""
+# Modified for the IM Tool: broadcast the bounding box tests and solve all segment pairs at once
+# (same results, much less memory and no python loop for the long Hugoniot arrays).
 def _rect_inter_inner(x1, x2):
-    n1 = x1.shape[0]-1
-    n2 = x2.shape[0]-1
-    X1 = np.c_[x1[:-1], x1[1:]]
-    X2 = np.c_[x2[:-1], x2[1:]]
-    S1 = np.tile(X1.min(axis=1), (n2, 1)).T
-    S2 = np.tile(X2.max(axis=1), (n1, 1))
-    S3 = np.tile(X1.max(axis=1), (n2, 1)).T
-    S4 = np.tile(X2.min(axis=1), (n1, 1))
-    return S1, S2, S3, S4
+    # segment bounding boxes as column (n1,1) and row (1,n2) vectors;
+    # comparisons broadcast to n1 x n2 booleans without tiling n1 x n2 float arrays
+    X1min = np.minimum(x1[:-1], x1[1:])[:, np.newaxis]
+    X1max = np.maximum(x1[:-1], x1[1:])[:, np.newaxis]
+    X2min = np.minimum(x2[:-1], x2[1:])[np.newaxis, :]
+    X2max = np.maximum(x2[:-1], x2[1:])[np.newaxis, :]
+    return X1min, X2max, X1max, X2min
 def _rectangle_intersection_(x1, y1, x2, y2):
     S1, S2, S3, S4 = _rect_inter_inner(x1, x2)
     S5, S6, S7, S8 = _rect_inter_inner(y1, y2)
@@ -1123,36 +1186,116 @@ def Intersection(x1, y1, x2, y2):
     y2 = np.asarray(y2)
 
     ii, jj = _rectangle_intersection_(x1, y1, x2, y2)
-    n = len(ii)
-
-    dxy1 = np.diff(np.c_[x1, y1], axis=0)
-    dxy2 = np.diff(np.c_[x2, y2], axis=0)
+    return _solve_segments(x1, y1, x2, y2, ii, jj)
+def _solve_segments(x1, y1, x2, y2, ii, jj):
+    # solve x1[i]+t*dx1 = x2[j]+s*dx2 and y1[i]+t*dy1 = y2[j]+s*dy2 for all candidate
+    # segment pairs at once (Cramer's rule) instead of one linear solve per pair
+    dx1 = np.diff(x1)[ii]
+    dy1 = np.diff(y1)[ii]
+    dx2 = np.diff(x2)[jj]
+    dy2 = np.diff(y2)[jj]
+    xoff = x2[jj] - x1[ii]
+    yoff = y2[jj] - y1[ii]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        det = dx2*dy1 - dx1*dy2 # zero for parallel segments -> t,s not finite and rejected below
+        t = (dx2*yoff - dy2*xoff) / det
+        s = (dx1*yoff - dy1*xoff) / det
 
-    T = np.zeros((4, n))
-    AA = np.zeros((4, 4, n))
-    AA[0:2, 2, :] = -1
-    AA[2:4, 3, :] = -1
-    AA[0::2, 0, :] = dxy1[ii, :].T
-    AA[1::2, 1, :] = dxy2[jj, :].T
-
-    BB = np.zeros((4, n))
-    BB[0, :] = -x1[ii].ravel()
-    BB[1, :] = -x2[jj].ravel()
-    BB[2, :] = -y1[ii].ravel()
-    BB[3, :] = -y2[jj].ravel()
-
-    for i in range(n):
-        try:
-            T[:, i] = np.linalg.solve(AA[:, :, i], BB[:, i])
-        except:
-            T[:, i] = np.Inf
+    in_range = (t >= 0) & (s >= 0) & (t <= 1) & (s <= 1)
 
-    in_range = (T[0, :] >= 0) & (T[1, :] >= 0) & (
-        T[0, :] <= 1) & (T[1, :] <= 1)
-
-    xy0 = T[2:, in_range]
-    xy0 = xy0.T
-    return xy0[:, 0], xy0[:, 1]
+    x0 = x1[ii[in_range]] + t[in_range]*dx1[in_range]
+    y0 = y1[ii[in_range]] + t[in_range]*dy1[in_range]
+    return x0, y0
+def _monotonic_candidates(x1, y1, x2, y2):
+    # candidate segment pairs (ii, jj) of two curves whose x values are monotonic apart from NaNs,
+    # found with binary searches instead of comparing the bounding boxes of every pair of segments;
+    # same order as _rectangle_intersection_; returns None if x2 is not monotonic
+    x1lo = np.minimum(x1[:-1], x1[1:])
+    x1hi = np.maximum(x1[:-1], x1[1:])
+    x2lo = np.minimum(x2[:-1], x2[1:])
+    x2hi = np.maximum(x2[:-1], x2[1:])
+    valid2 = np.flatnonzero(np.isfinite(x2lo) & np.isfinite(x2hi)) # NaN segments never intersect
+    lo2 = x2lo[valid2]
+    hi2 = x2hi[valid2]
+    if (len(lo2) > 1) and (lo2[0] > lo2[-1]):
+        # decreasing x2; search the segments in increasing order
+        valid2, lo2, hi2 = valid2[::-1], lo2[::-1], hi2[::-1]
+    if np.any(np.diff(lo2) < 0) or np.any(np.diff(hi2) < 0):
+        return None
+    # segments of curve 2 that overlap segment i of curve 1 in x are valid2[jstart[i]:jend[i]]
+    jstart = np.searchsorted(hi2, x1lo, side='left')
+    jend = np.searchsorted(lo2, x1hi, side='right')
+    counts = np.where(np.isfinite(x1lo) & np.isfinite(x1hi), np.maximum(jend-jstart, 0), 0)
+    ii = np.repeat(np.arange(len(x1lo)), counts)
+    jj = valid2[np.arange(len(ii)) - np.repeat(np.cumsum(counts)-counts, counts) + np.repeat(jstart, counts)]
+    order = np.lexsort((jj, ii))
+    ii, jj = ii[order], jj[order]
+    # keep pairs whose y ranges also overlap
+    keep = ((np.minimum(y1[ii], y1[ii+1]) <= np.maximum(y2[jj], y2[jj+1])) &
+            (np.maximum(y1[ii], y1[ii+1]) >= np.minimum(y2[jj], y2[jj+1])))
+    return ii[keep], jj[keep]
+def _intersection_monotonic(x1, y1, x2, y2):
+    # Intersection for curves with monotonic x arrays; general search if x2 turns out not to be monotonic
+    cand = _monotonic_candidates(x1, y1, x2, y2)
+    if cand is None:
+        return Intersection(x1, y1, x2, y2)
+    return _solve_segments(x1, y1, x2, y2, cand[0], cand[1])
+def _window_slice(x, lo, hi):
+    # slice of monotonic array x covering lo <= x <= hi plus one neighboring point on each side,
+    # so every segment that crosses the window is kept
+    ind = np.nonzero((x >= lo) & (x <= hi))[0]
+    if len(ind) == 0:
+        return slice(0, 0)
+    return slice(max(ind[0]-1, 0), ind[-1]+2)
+def IntersectionLocal(x1, y1, x2, y2, hint_x, window=0.5):
+    """ Intersections of two curves with monotonic x arrays, searching near an expected crossing first.
+        Usage: x,y=IntersectionLocal(x1,y1,x2,y2,hint_x,window=0.5)
+        Inputs: curves as in Intersection; hint_x is the expected x of the crossing.
+                Optional window: first search only hint_x*(1-window) <= x <= hint_x*(1+window).
+        Output: same as Intersection. Falls back to the full curves if there is no crossing in the window.
+    """
+    x1 = np.asarray(x1)
+    x2 = np.asarray(x2)
+    y1 = np.asarray(y1)
+    y2 = np.asarray(y2)
+    lo = hint_x*(1-window)
+    hi = hint_x*(1+window)
+    i1 = _window_slice(x1, lo, hi)
+    i2 = _window_slice(x2, lo, hi)
+    x0, y0 = _intersection_monotonic(x1[i1], y1[i1], x2[i2], y2[i2])
+    if len(x0) == 0:
+        # no crossing near the hint; search the full curves
+        x0, y0 = _intersection_monotonic(x1, y1, x2, y2)
+    return x0, y0
+def IntersectMonotonic(x1, y1, x2, y2):
+    """ First intersection of two curves that are both single-valued in x (e.g., two principal Hugoniots).
+        Usage: x,y=IntersectMonotonic(x1,y1,x2,y2)
+        Inputs: curves as in Intersection; x1 and x2 are each monotonic (increasing or decreasing).
+        Output: same as Intersection, but only the crossing(s) at the first sign change along x1.
+                The crossing is bracketed from the sign change of y1 - y2(x1) and then solved exactly
+                on the bracketing segments, so the result agrees with Intersection to rounding.
+                Falls back to the full curves if no sign change is found.
+    """
+    x1 = np.asarray(x1)
+    x2 = np.asarray(x2)
+    y1 = np.asarray(y1)
+    y2 = np.asarray(y2)
+    if x2[0] > x2[-1]:
+        # np.interp needs increasing x
+        d = y1 - np.interp(x1, x2[::-1], y2[::-1], left=np.nan, right=np.nan)
+    else:
+        d = y1 - np.interp(x1, x2, y2, left=np.nan, right=np.nan)
+    sgn = np.sign(d) # nan outside the overlap of the two curves
+    ind = np.flatnonzero(sgn[:-1]*sgn[1:] <= 0) # sign change or exact zero between neighbors
+    if len(ind) > 0:
+        i = ind[0]
+        i1 = slice(max(i-1, 0), i+3) # bracketing segment of curve 1 plus one neighbor on each side
+        i2 = _window_slice(x2, min(x1[i1]), max(x1[i1]))
+        x0, y0 = Intersection(x1[i1], y1[i1], x2[i2], y2[i2])
+        if len(x0) > 0:
+            return x0, y0
+    # no clean sign change; search the full curves
+    return Intersection(x1, y1, x2, y2)
 #
 ### END of IM_module.py ###
 #==================================================================================================
@@ -0,0 +1,18 @@
+""" Shared pytest setup: IM_module from the repository top directory and the default materials table. """
+import os
+import sys
+
+import pytest
+
+TOPDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, TOPDIR)
+import IM_module as IM
+
+@pytest.fixture(scope='session')
+def matdata():
+    cwd = os.getcwd()
+    os.chdir(TOPDIR)
+    try:
+        yield IM.ReadMaterials(matfilename='materials-data.csv')
+    finally:
+        os.chdir(cwd)
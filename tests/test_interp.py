@@ -0,0 +1,22 @@
+""" Checks _interp_point against separate np.interp calls, as used for the matched-state volume and energy. """
+import numpy as np
+import pytest
+
+import IM_module as IM
+
+@pytest.mark.parametrize('name', ['Copper', 'Water-ulh'])
+def test_interp_point_matches_np_interp(matdata, name):
+    matdat, imat = matdata
+    mat = IM.Material()
+    mat.DefineParamsID(name, matdat, imat)
+    mat.MakeHugoniot(np.linspace(0., 10000., 2001)**1.5/100.) # m/s; non-uniform grid
+    xp = mat.hug.uparr
+    fparrs = [mat.hug.varr, mat.hug.earr]
+    xs = [1234.567, 0.5*(xp[10]+xp[11]), # interior
+          xp[500], # on a grid point
+          xp[0], xp[-1], # endpoints
+          -100., xp[-1]+100.] # out of range: clamped to the end values
+    for x in xs:
+        v, e = IM._interp_point(x, xp, fparrs)
+        np.testing.assert_allclose(v, np.interp(x, xp, mat.hug.varr), rtol=1.e-12, atol=0.)
+        np.testing.assert_allclose(e, np.interp(x, xp, mat.hug.earr), rtol=1.e-12, atol=1.e-12)
@@ -0,0 +1,48 @@
+""" Checks IntersectMonotonic against the general Intersection on impedance match pairs.
+    Run from the repository top directory: python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+import IM_module as IM
+
+def make_mat(name, matdata, uparr):
+    matdat, imat = matdata
+    mat = IM.Material()
+    mat.DefineParamsID(name, matdat, imat)
+    mat.MakeHugoniot(uparr)
+    return mat
+
+@pytest.mark.parametrize('flyer,target,vel,hint,fold', [
+    ('Aluminium 6061', 'Copper', 5000., 1., False),
+    ('Copper', 'Tantalum', 7000., 1., False),
+    ('Tantalum', 'Aluminium 6061', 3000., 1., False),
+    ('Copper', 'Copper', 2000., 1., False), # matched pair: crossing at vel/2
+    ('LiF', 'LiF', 6000., 1., False), # matched pair
+    ('Copper', 'Tantalum', 7000., 1./1.5, False), # crossing at the upper edge of the IntersectionLocal window
+    ('Aluminium 6061', 'Copper', 5000., 0.5, False), # crossing above the window: full-curve fallback
+    ('Aluminium 6061', 'Copper', 5000., 2.5, False), # crossing below the window: full-curve fallback
+    ('Copper', 'Tantalum', 7000., 1., True), # curve 2 not monotonic: general Intersection fallback
+])
+def test_intersect_monotonic_matches_intersection(matdata, flyer, target, vel, hint, fold):
+    uparr = np.linspace(0., 2.*vel, 2001) # m/s
+    mata = make_mat(flyer, matdata, uparr)
+    matb = make_mat(target, matdata, uparr)
+    x2 = vel-mata.hug.uparr
+    if fold:
+        # step x2 back up far from the crossing so it is not monotonic
+        x2[-4] = x2[-8]
+    args = (matb.hug.uparr, matb.hug.parr, x2, mata.hug.parr)
+    upref, pref = IM.Intersection(*args)
+    assert len(upref) > 0
+    if fold:
+        assert IM._monotonic_candidates(*args) is None
+    else:
+        up, p = IM.IntersectMonotonic(*args)
+        np.testing.assert_allclose(up[0], upref[0], rtol=1.e-9)
+        np.testing.assert_allclose(p[0], pref[0], rtol=1.e-9)
+    up, p = IM.IntersectionLocal(*args, hint*upref[0], window=0.5)
+    np.testing.assert_allclose(up[0], upref[0], rtol=1.e-9)
+    np.testing.assert_allclose(p[0], pref[0], rtol=1.e-9)
+    if flyer == target:
+        np.testing.assert_allclose(up[0], vel/2., rtol=1.e-9)
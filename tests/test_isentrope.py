@@ -0,0 +1,33 @@
+""" Checks the Mie-Grueneisen release isentrope against a stored reference.
+    data/mg_isentrope_ref.npz was made with the NumPy version of Material.MakeMGIsentrope
+    (before the recurrence moved to _mg_isentrope_loop), with the same cases and grid as below.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import IM_module as IM
+
+REFFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'mg_isentrope_ref.npz')
+
+@pytest.mark.parametrize('name,up0,impvel', [
+    ('Copper', 1500., 4000.),
+    ('LiF', 2000., 5000.),
+    ('Aluminium 6061', 1000., 2000.), # symmetric impact start state
+    ('Water-ulh', 3000., 8000.), # universal liquid Hugoniot
+])
+def test_mg_isentrope_matches_reference(matdata, name, up0, impvel):
+    matdat, imat = matdata
+    mat = IM.Material()
+    mat.DefineParamsID(name, matdat, imat)
+    mat.MakeHugoniot(np.linspace(0., 5.*impvel, 1001)) # m/s
+    pstart = IM.EOS_Point()
+    pstart.up = up0
+    pstart.p = np.interp(up0, mat.hug.uparr, mat.hug.parr)
+    pstart.v = np.interp(up0, mat.hug.uparr, mat.hug.varr)
+    pstart.e = np.interp(up0, mat.hug.uparr, mat.hug.earr)
+    assert mat.MakeMGIsentrope(pstart, usemgmodelbool=True, impvel=impvel)
+    ref = np.load(REFFILE)
+    for arrname in ['parr', 'earr', 'uparr']:
+        np.testing.assert_allclose(getattr(mat.isen, arrname), ref[name+'/'+arrname], rtol=1.e-12, atol=0., equal_nan=True)